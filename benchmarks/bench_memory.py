@@ -0,0 +1,32 @@
+"""
+    memory held per live SudokuLogic board, measured with tracemalloc
+    run from repo root: python benchmarks/bench_memory.py [num_boards]
+"""
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sudoku_model import SudokuLogic
+
+def main():
+    num_boards = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    random.seed(0)
+    for square_size in (3, 4):
+        size = square_size * square_size
+        # warm up solver/context caches so they are not counted
+        SudokuLogic(square_size=square_size)
+
+        tracemalloc.start()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        models = [SudokuLogic(square_size=square_size) for _ in range(num_boards)]
+        held_memory = tracemalloc.get_traced_memory()[0] - start_memory
+        tracemalloc.stop()
+
+        print("%dx%d: %.0f bytes per board (%d boards)" % (size, size, held_memory / len(models), len(models)))
+        del models
+
+if __name__ == "__main__":
+    main()
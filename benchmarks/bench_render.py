@@ -0,0 +1,48 @@
+"""
+    SudokuGui.update_gui frame cost: full redraw every frame (old behaviour)
+    against dirty-rectangle frames, under SDL dummy video driver
+    run from repo root: python benchmarks/bench_render.py [num_frames]
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+from main import SudokuGui, SudokuLogic, MouseData
+
+def run_frames(gui, model, num_frames, mouse_positions, force_full):
+    start = time.perf_counter()
+    for n in range(num_frames):
+        if force_full:
+            gui.invalidate()
+        mouse_data = MouseData(position=mouse_positions[n % len(mouse_positions)])
+        gui.update_gui(model.game_board, None, mouse_data, False)
+    return (time.perf_counter() - start) / num_frames
+
+def main():
+    num_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    random.seed(0)
+    pygame.init()
+    model = SudokuLogic()
+    gui = SudokuGui(model.game_board)
+    gui.fps = 0# no frame limit
+
+    idle = [(630, 470)]
+    moving = [(random.randrange(640), random.randrange(480)) for _ in range(num_frames)]
+
+    results = [
+        ("full redraw, idle mouse", run_frames(gui, model, num_frames, idle, True)),
+        ("dirty rects, idle mouse", run_frames(gui, model, num_frames, idle, False)),
+        ("full redraw, moving mouse", run_frames(gui, model, num_frames, moving, True)),
+        ("dirty rects, moving mouse", run_frames(gui, model, num_frames, moving, False)),
+    ]
+    for name, frame_time in results:
+        print("%-27s %8.1f us/frame" % (name, frame_time * 1e6))
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+    generation, clue removal and validation cost for box sizes 3, 4 and 5
+    run from repo root: python benchmarks/bench_sizes.py [repeats]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sudoku_utils import generate_sudoku_board, get_unique_clear_table, checkRowsCols, checkSquares
+
+# share of cells left as clues by the removal stage
+CLUE_SHARE = {3: 0.4, 4: 0.55, 5: 0.65}
+
+def time_per_call(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    random.seed(0)
+    try:
+        import numpy as np
+        from sudoku_batch import check_boards
+    except ImportError:
+        np = None
+
+    print("%-6s %12s %12s %14s %14s %14s" % ("size", "generate", "validate", "validate(np)", "removal", "clues"))
+    for square_size in (3, 4, 5):
+        size = square_size * square_size
+        board = generate_sudoku_board(square_size)
+        target_clues = int(size * size * CLUE_SHARE[square_size])
+
+        generate_time = time_per_call(lambda: generate_sudoku_board(square_size), repeats * 20)
+        validate_time = time_per_call(lambda: checkRowsCols(board) and checkSquares(board), repeats * 20)
+        if np is not None:
+            boards = np.array([board] * 1000, dtype=np.uint8)
+            batch_time = time_per_call(lambda: check_boards(boards), repeats) / len(boards)
+        else:
+            batch_time = float('nan')
+
+        clues = []
+        def removal():
+            clear_table = get_unique_clear_table(board, target_clues)
+            clues.append(sum(map(sum, clear_table)))
+        removal_time = time_per_call(removal, repeats)
+
+        print("%-6s %10.1fus %10.1fus %12.2fus %12.1fms %14.0f" % ("%dx%d" % (size, size),
+            generate_time * 1e6, validate_time * 1e6, batch_time * 1e6, removal_time * 1e3,
+            sum(clues) / len(clues)))
+
+if __name__ == "__main__":
+    main()
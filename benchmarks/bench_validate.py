@@ -0,0 +1,48 @@
+"""
+    batched numpy validation against checkRowsCols/checkSquares called in a loop
+    run from repo root: python benchmarks/bench_validate.py [num_boards]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sudoku_utils import generate_sudoku_board, checkRowsCols, checkSquares
+from sudoku_batch import check_boards
+
+def make_boards(num_boards, seed=0):
+    random.seed(seed)
+    boards = []
+    for n in range(num_boards):
+        board = generate_sudoku_board()
+        if n % 2:
+            # break every second board
+            y, x = random.randrange(9), random.randrange(9)
+            board[y][x] = board[y][x] % 9 + 1
+        boards.append(board)
+    return boards
+
+def main():
+    num_boards = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    boards = make_boards(num_boards)
+    array = np.array(boards, dtype=np.uint8)
+
+    start = time.perf_counter()
+    scalar = [checkRowsCols(board) and checkSquares(board) for board in boards]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = check_boards(array)
+    batched_time = time.perf_counter() - start
+
+    assert scalar == batched.tolist()
+    print("boards:", num_boards)
+    print("scalar loop: %.4f s (%.0f boards/s)" % (scalar_time, num_boards / scalar_time))
+    print("numpy batch: %.4f s (%.0f boards/s)" % (batched_time, num_boards / batched_time))
+    print("speedup: %.1fx" % (scalar_time / batched_time))
+
+if __name__ == "__main__":
+    main()
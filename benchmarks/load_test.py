@@ -0,0 +1,156 @@
+"""
+    load test of sudoku_server: many concurrent clients each play sessions with
+    new, moves, hints, check and solved requests, then throughput and latency
+    percentiles per op are printed. by default a local server is started on a unix socket.
+
+    run from repo root:
+        python benchmarks/load_test.py --clients 500 --sessions 2
+        python benchmarks/load_test.py --connect 127.0.0.1:8765 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_profiler import percentile
+
+SEED = 1234
+SERVER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sudoku_server.py')
+
+class LoadClient:
+    """
+        one connection, requests are sent one after another and timed until response
+    """
+    def __init__(self, reader, writer, latencies):
+        self.reader = reader
+        self.writer = writer
+        self.latencies = latencies# op -> list of seconds, shared by clients
+        self.num_errors = 0
+
+    async def request(self, op, **fields):
+        fields['op'] = op
+        start = time.perf_counter()
+        self.writer.write(json.dumps(fields).encode() + b'\n')
+        await self.writer.drain()
+        line = await self.reader.readline()
+        self.latencies.setdefault(op, []).append(time.perf_counter() - start)
+        if not line:
+            raise ConnectionError("server closed connection")
+        response = json.loads(line)
+        if not response['ok']:
+            self.num_errors += 1
+        return response
+
+    async def play_session(self, rng, args):
+        response = await self.request('new', clues=args.clues, square_size=args.square_size)
+        if not response['ok']:
+            return
+        session = response['session']
+        size = args.square_size * args.square_size
+        empty_cells = [divmod(i, size) for i, char in enumerate(response['board']) if char == '.']
+        for n in range(args.moves):
+            if n % 10 == 9:
+                hint = await self.request('hint', session=session)
+                if hint['ok'] and (hint['row'], hint['col']) in empty_cells:
+                    empty_cells.remove((hint['row'], hint['col']))# hinted cells can not be changed
+            elif n % 10 == 4:
+                await self.request('check', session=session)
+            elif empty_cells:
+                row, col = rng.choice(empty_cells)
+                await self.request('move', session=session, row=row, col=col, value=rng.randint(0, size))
+            await self.request('solved', session=session)
+        await self.request('close', session=session)
+
+async def run_client(client_id, args, connect, latencies):
+    rng = random.Random(SEED + client_id)
+    reader, writer = await connect()
+    client = LoadClient(reader, writer, latencies)
+    try:
+        for _ in range(args.sessions):
+            await client.play_session(rng, args)
+    finally:
+        writer.close()
+    return client.num_errors
+
+async def start_local_server(args, socket_path):
+    process = await asyncio.create_subprocess_exec(sys.executable, SERVER_PATH, '--unix', socket_path,
+        '--workers', str(args.workers), '--max-sessions', str(args.clients * 2),
+        stdout=asyncio.subprocess.PIPE)
+    line = await process.stdout.readline()# "listening on ..." once it accepts connections
+    if not line:
+        raise Exception("server did not start")
+    return process
+
+def report(latencies, elapsed, num_errors):
+    """
+        dict of total throughput and per-op count and latency percentiles in ms
+    """
+    all_times = sorted(t for times in latencies.values() for t in times)
+    result = {'requests': len(all_times), 'errors': num_errors, 'seconds': elapsed,
+        'requests_per_s': len(all_times) / elapsed if elapsed > 0 else 0.0, 'ops': {}}
+    for op, times in sorted(latencies.items()) + [('all', all_times)]:
+        times = sorted(times)
+        result['ops'][op] = {'count': len(times), 'p50_ms': percentile(times, 50) * 1000,
+            'p95_ms': percentile(times, 95) * 1000, 'p99_ms': percentile(times, 99) * 1000,
+            'max_ms': (times[-1] if times else 0.0) * 1000}
+    return result
+
+def print_report(result):
+    print("%d requests in %.2f s, %.0f requests/s, %d errors" % (result['requests'], result['seconds'],
+        result['requests_per_s'], result['errors']))
+    print("%-8s %8s %9s %9s %9s %9s" % ("op", "count", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+    for op, stats in result['ops'].items():
+        print("%-8s %8d %9.2f %9.2f %9.2f %9.2f" % (op, stats['count'], stats['p50_ms'], stats['p95_ms'],
+            stats['p99_ms'], stats['max_ms']))
+
+async def run_load_test(args):
+    process = None
+    temp_dir = None
+    if args.connect is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        socket_path = os.path.join(temp_dir.name, 'sudoku.sock')
+        process = await start_local_server(args, socket_path)
+        connect = lambda: asyncio.open_unix_connection(socket_path)
+    else:
+        host, port = args.connect.rsplit(':', 1)
+        connect = lambda: asyncio.open_connection(host, int(port))
+
+    latencies = {}
+    try:
+        start = time.perf_counter()
+        errors = await asyncio.gather(*(run_client(n, args, connect, latencies) for n in range(args.clients)))
+        elapsed = time.perf_counter() - start
+    finally:
+        if process is not None:
+            process.terminate()
+            await process.wait()
+            temp_dir.cleanup()
+    return report(latencies, elapsed, sum(errors))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="sudoku_server load test")
+    parser.add_argument('--connect', default=None, metavar='HOST:PORT', help="running server, default starts one")
+    parser.add_argument('--clients', type=int, default=200, help="concurrent connections")
+    parser.add_argument('--sessions', type=int, default=1, help="games per client, one after another")
+    parser.add_argument('--moves', type=int, default=50, help="moves, hints and checks per game")
+    parser.add_argument('--clues', type=int, default=30)
+    parser.add_argument('--square-size', type=int, default=3, choices=[2,3,4])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="generation processes of local server")
+    parser.add_argument('--output', default=None, help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run_load_test(args))
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(result, output_file, indent=2)
+    return 1 if result['errors'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
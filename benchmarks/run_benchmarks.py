@@ -0,0 +1,237 @@
+"""
+    benchmark suite of generation, validation, per-frame model work, headless gui frames
+    and scripted mouse sessions through SudokuGame.run_game. random is seeded for every case.
+
+    run from repo root:
+        python benchmarks/run_benchmarks.py                       compare with benchmarks/baseline.json
+        python benchmarks/run_benchmarks.py --output result.json  also write results
+        python benchmarks/run_benchmarks.py --update-baseline     store results as new baseline
+    exits with 1 if some case is slower than baseline by more than --threshold
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pygame
+from sudoku_utils import generate_sudoku_board, get_clear_table, checkRowsCols, checkSquares, generate_grids,\
+    fill_random_grid
+from sudoku_batch import generate_grid_batch
+from sudoku_model import SudokuLogic
+from main import SudokuGui, SudokuGame, MouseData
+
+SEED = 1234
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def measure(func, number, repeats):
+    """
+        median and min time of one func call in microseconds over repeats runs of number calls
+    """
+    times = []
+    for _ in range(repeats):
+        random.seed(SEED)
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number * 1e6)
+    return {'median_us': statistics.median(times), 'min_us': min(times)}
+
+def bench_generation(results, repeats):
+    results['generate_sudoku_board'] = measure(generate_sudoku_board, 500, repeats)
+    results['get_clear_table'] = measure(lambda: get_clear_table(percent_clear=40), 500, repeats)
+
+    # per grid: stream keeps making fills as it goes, batch of 10000 is one call.
+    # symmetry copies of one fill are one grid up to symmetry, fill_random_grid is the rate of
+    # essentially different grids
+    results['fill_random_grid'] = measure(fill_random_grid, 500, repeats)
+    grids = generate_grids()
+    results['generate_grids'] = measure(lambda: next(grids), 2000, repeats)
+    batch_result = measure(lambda: generate_grid_batch(10000, rng=np.random.default_rng(SEED)), 1, repeats)
+    results['generate_grid_batch'] = {name: value / 10000 for name, value in batch_result.items()}
+
+def bench_validation(results, repeats):
+    random.seed(SEED)
+    board = generate_sudoku_board()
+    results['checkRowsCols'] = measure(lambda: checkRowsCols(board), 1000, repeats)
+    results['checkSquares'] = measure(lambda: checkSquares(board), 1000, repeats)
+
+def bench_model_frame(results, repeats):
+    """
+        model calls SudokuGame.run_game makes every frame, idle and with one move per frame
+    """
+    random.seed(SEED)
+    model = SudokuLogic(target_clues=40)
+    empty_cells = [divmod(i, model.size) for i, value in enumerate(model.game_board.values) if value == 0]
+
+    def idle_frame():
+        model.update_correct_values(True)
+        model.is_puzzle_solved()
+    results['model_frame_idle'] = measure(idle_frame, 2000, repeats)
+
+    moves = [(y, x, random.randint(1, 9)) for y, x in empty_cells] * 10
+    move_iter = [iter(moves)]
+    def move_frame():
+        move = next(move_iter[0], None)
+        if move is None:
+            move_iter[0] = iter(moves)
+            move = next(move_iter[0])
+        model.update_cell(*move)
+        model.update_correct_values(True)
+        model.is_puzzle_solved()
+    results['model_frame_move'] = measure(move_frame, 2000, repeats)
+
+def bench_gui_frame(results, repeats):
+    """
+        SudokuGui.update_gui under dummy video driver: full redraw, idle and moving mouse
+    """
+    pygame.init()
+    random.seed(SEED)
+    model = SudokuLogic(target_clues=40)
+    gui = SudokuGui(model.game_board)
+    gui.fps = 0# no frame limit
+    positions = [(random.randrange(640), random.randrange(480)) for _ in range(500)]
+    position_iter = [0]
+
+    def full_frame():
+        gui.invalidate()
+        gui.update_gui(model.game_board, 3, MouseData(position=(630, 470)), False)
+    def idle_frame():
+        gui.update_gui(model.game_board, 3, MouseData(position=(630, 470)), False)
+    def moving_frame():
+        position_iter[0] = (position_iter[0] + 1) % len(positions)
+        gui.update_gui(model.game_board, 3, MouseData(position=positions[position_iter[0]]), False)
+
+    results['gui_frame_full'] = measure(full_frame, 200, repeats)
+    results['gui_frame_idle'] = measure(idle_frame, 1000, repeats)
+    results['gui_frame_moving'] = measure(moving_frame, 1000, repeats)
+    pygame.quit()
+
+def make_mouse_script(gui, num_frames):
+    """
+        list of per-frame event lists: moves over the board, number picks and cell clicks
+    """
+    script = []
+    for frame in range(num_frames):
+        cell = random.choice(gui.grid_cells)
+        events = [pygame.event.Event(pygame.MOUSEMOTION, pos=cell.rect.center, rel=(1, 1), buttons=(0, 0, 0))]
+        if frame % 10 == 0:
+            number_cell = random.choice(gui.number_cells)
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=number_cell.rect.center, button=1))
+        elif frame % 10 == 5:
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=cell.rect.center, button=1))
+        elif frame % 50 == 25:
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN,
+                pos=gui.button_check_correct.rect.center, button=1))
+        script.append(events)
+    return script
+
+def replay_session(num_frames):
+    """
+        one SudokuGame.run_game session driven by scripted pygame events, returns time per frame
+    """
+    game = SudokuGame(event_driven=False, prefetch_depth=0)
+    game.log_callback = lambda log_text: None
+    gui = game.sudoku_gui
+    gui.fps = 0# no frame limit
+    script = make_mouse_script(gui, num_frames)
+    check_events = gui.check_events
+    frame = [0]
+    mouse_pos = [(0, 0)]
+
+    def scripted_check_events():
+        # post next frame of the script, then read it through the real event queue.
+        # posted motion does not move the mouse of dummy driver, position comes from script
+        if frame[0] < len(script):
+            for event in script[frame[0]]:
+                pygame.event.post(event)
+                if event.type == pygame.MOUSEMOTION:
+                    mouse_pos[0] = event.pos
+        else:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+        frame[0] += 1
+        is_quit, _, is_mouse_pressed = check_events()
+        return is_quit, mouse_pos[0], is_mouse_pressed
+    gui.check_events = scripted_check_events
+
+    start = time.perf_counter()
+    game.run_game()
+    return (time.perf_counter() - start) / frame[0] * 1e6
+
+def bench_run_game(results, repeats):
+    times = []
+    for _ in range(repeats):
+        random.seed(SEED)
+        times.append(replay_session(300))
+    results['run_game_scripted_frame'] = {'median_us': statistics.median(times), 'min_us': min(times)}
+
+BENCHMARKS = [bench_generation, bench_validation, bench_model_frame, bench_gui_frame, bench_run_game]
+
+def compare(results, baseline, threshold):
+    """
+        prints table against baseline, returns names of cases slower than threshold.
+        min of the repeats is compared, it is the least noisy number.
+        baseline numbers are only meaningful on the machine that wrote them
+    """
+    regressions = []
+    print("%-26s %12s %12s %8s" % ("case", "min us", "baseline", "change"))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print("%-26s %12.2f %12s %8s" % (name, result['min_us'], "-", "new"))
+            continue
+        change = result['min_us'] / base['min_us'] - 1
+        mark = ""
+        if change > threshold:
+            regressions.append(name)
+            mark = " REGRESSION"
+        print("%-26s %12.2f %12.2f %+7.1f%%%s" % (name, result['min_us'], base['min_us'], change * 100, mark))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="sudoku benchmark suite")
+    parser.add_argument('--output', default=None, help="write results JSON here")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON to compare with")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown, 0.25 is 25%%")
+    parser.add_argument('--repeats', type=int, default=7)
+    parser.add_argument('--update-baseline', action='store_true', help="write results to baseline file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for bench in BENCHMARKS:
+        bench(results, args.repeats)
+
+    report = {'seed': SEED, 'python': sys.version.split()[0], 'pygame': pygame.version.ver, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print("baseline written to", args.baseline)
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline_report = json.load(baseline_file)
+        baseline = baseline_report['results']
+        for name in ('python', 'pygame'):
+            if baseline_report.get(name) != report[name]:
+                print("warning: baseline was recorded with %s %s, running %s" % (name, baseline_report.get(name),
+                    report[name]))
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("slower than baseline by more than %.0f%%: %s" % (args.threshold * 100, ", ".join(regressions)))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
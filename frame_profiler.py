@@ -0,0 +1,127 @@
+"""
+    per-stage frame times of SudokuGame.run_game kept in a fixed-size ring buffer
+
+    python main.py --frame-overlay --frame-stats frames.csv
+    python main.py --profile-stage render --profile-output render.prof
+"""
+import cProfile
+import csv
+import json
+import pstats
+import sys
+import time
+from array import array
+
+# stages of one frame in the order run_game goes through them
+STAGES = ('events', 'interaction', 'model', 'render', 'present')
+
+def percentile(sorted_values, percent):
+    # nearest rank
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+class FrameTimer:
+    """
+        times of STAGES for the last capacity frames. start_frame() begins a frame,
+        every mark() ends current stage, the frame is recorded after the last stage.
+        with profile_stage set, cProfile runs only while that stage runs
+    """
+    def __init__(self, capacity=1024, profile_stage=None):
+        self.capacity = capacity
+        self.num_stages = len(STAGES)
+        self.times = array('d', bytes(8 * capacity * self.num_stages))# seconds, frame after frame
+        self.num_frames = 0# recorded frames, ring slot of next frame is num_frames % capacity
+        self.frame_offset = 0
+        self.stage = 0
+        self.last_time = 0.0
+
+        self.profile_stage = STAGES.index(profile_stage) if profile_stage is not None else -1
+        self.profiler = cProfile.Profile() if profile_stage is not None else None
+
+    def start_frame(self):
+        self.frame_offset = (self.num_frames % self.capacity) * self.num_stages
+        self.stage = 0
+        if self.profile_stage == 0:
+            self.profiler.enable()
+        self.last_time = time.perf_counter()
+
+    def mark(self):
+        now = time.perf_counter()
+        stage = self.stage
+        if stage == self.profile_stage:
+            self.profiler.disable()
+        self.times[self.frame_offset + stage] = now - self.last_time
+        stage += 1
+        self.stage = stage
+        if stage == self.num_stages:
+            self.num_frames += 1
+            return
+        if stage == self.profile_stage:
+            self.profiler.enable()
+        self.last_time = now
+
+    def cancel_frame(self):
+        # frame ended early (idle wake up, quit), nothing is recorded
+        if self.stage == self.profile_stage:
+            self.profiler.disable()
+        self.stage = self.num_stages
+
+    def frames(self):
+        """
+            stage times of recorded frames in seconds, oldest first
+        """
+        count = min(self.num_frames, self.capacity)
+        first = self.num_frames - count
+        frames = []
+        for n in range(first, self.num_frames):
+            offset = (n % self.capacity) * self.num_stages
+            frames.append(self.times[offset:offset + self.num_stages].tolist())
+        return frames
+
+    def summary(self):
+        """
+            p50/p99/max in ms for every stage and the whole frame
+        """
+        frames = self.frames()
+        columns = {stage: sorted(frame[n] for frame in frames) for n, stage in enumerate(STAGES)}
+        columns['frame'] = sorted(sum(frame) for frame in frames)
+        return {name: {'p50_ms': percentile(values, 50) * 1000, 'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': (values[-1] if values else 0.0) * 1000} for name, values in columns.items()}
+
+    def overlay_text(self):
+        frame_times = sorted(sum(frame) for frame in self.frames())
+        return "frame p50 %.1f ms  p99 %.1f ms" % (percentile(frame_times, 50) * 1000,
+            percentile(frame_times, 99) * 1000)
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['frame'] + [stage + '_ms' for stage in STAGES] + ['total_ms'])
+            first = self.num_frames - min(self.num_frames, self.capacity)
+            for n, frame in enumerate(self.frames(), first):
+                writer.writerow([n] + ['%.4f' % (t * 1000) for t in frame] + ['%.4f' % (sum(frame) * 1000)])
+
+    def export_json(self, path):
+        with open(path, 'w') as json_file:
+            json.dump({'stages': STAGES, 'num_frames': self.num_frames, 'summary': self.summary(),
+                'frames_ms': [[t * 1000 for t in frame] for frame in self.frames()]}, json_file, indent=2)
+
+    def export(self, path):
+        # format by file extension, csv if it is not .json
+        if path.endswith('.json'):
+            self.export_json(path)
+        else:
+            self.export_csv(path)
+
+    def dump_profile(self, path=None):
+        """
+            write cProfile stats of profiled stage to path (pstats format) or print top of them
+        """
+        if self.profiler is None:
+            return
+        if path is not None:
+            self.profiler.dump_stats(path)
+        else:
+            pstats.Stats(self.profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(20)
@@ -1,19 +1,16 @@
+import argparse
+import math
+import os
 import pygame
-from sudoku_utils import *
+from sudoku_model import CellType, BoardCell, SudokuLogic
+from puzzle_bank import PuzzleBank
+from sudoku_prefetch import SudokuPrefetcher
+from sudoku_rating import DIFFICULTIES
+from frame_profiler import FrameTimer, STAGES
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
 
-class CellType(Enum):
-    CHANGEABLE = 0
-    NON_CHANGEABLE = 1
-    HINTED = 2
-    CHECKED_WRONG = 3
-
-@dataclass
-class BoardCell:
-    value: int
-    cell_type: CellType
-
 @dataclass
 class MouseData:
     position: (int,int)
@@ -22,7 +19,11 @@ class MouseData:
     pressed_number_cell: int = None
     pressed_hint: bool = False
     pressed_check_correct: bool = False
+    pressed_pencil_marks: bool = False
     restart: bool = False
+    # keyboard: ctrl+z, ctrl+y or ctrl+shift+z
+    undo: bool = False
+    redo: bool = False
 
 class ColorType(Enum):
     NORMAL = 0
@@ -43,28 +44,87 @@ class BackgroundColors:
         else:
             return self.color_normal
 
+class FontCache:
+    """
+        process-wide fonts by (family, size, bold) and rendered text surfaces
+        by (font key, text, color). text surfaces are dropped least recently used first.
+        everything is dropped on pygame.quit(), fonts must not outlive the font module
+    """
+    def __init__(self, max_renders=512):
+        self.max_renders = max_renders
+        self.fonts = {}
+        self.renders = OrderedDict()
+
+    def clear(self):
+        self.fonts.clear()
+        self.renders.clear()
+
+    def get_font(self, font_key):
+        font = self.fonts.get(font_key)
+        if font is None:
+            if not self.fonts:
+                # quit functions run once, register again for fonts of this pygame.init()
+                pygame.register_quit(self.clear)
+            family, size, bold = font_key
+            font = pygame.font.SysFont(family, size, bold=bold)
+            self.fonts[font_key] = font
+        return font
+
+    def render(self, font_key, text, color):
+        key = (font_key, text, color)
+        surface = self.renders.get(key)
+        if surface is None:
+            surface = self.get_font(font_key).render(text, True, color)
+            self.renders[key] = surface
+            if len(self.renders) > self.max_renders:
+                self.renders.popitem(last=False)
+        else:
+            self.renders.move_to_end(key)
+        return surface
+
+font_cache = FontCache()
+
 class GuiRectangle:
-    def __init__(self, screen_pointer, y,x, height, width, font_size=16, rectangle_text="", is_bold=False):
+    def __init__(self, screen_pointer, y,x, height, width, font_size=16, rectangle_text="", is_bold=False,
+                    text_color=((20,20,20))):
         self.screen_pointer = screen_pointer
-        self.font = pygame.font.SysFont('Arial', font_size, bold=is_bold)
-        self.font_render = self.font.render(rectangle_text, True, ((20,20,20)))
+        self.font_key = ('Arial', font_size, is_bold)
+        self.font = font_cache.get_font(self.font_key)
+        self.font_render = font_cache.render(self.font_key, rectangle_text, text_color)
 
         self.surface = pygame.Surface((width, height))
         self.rect = pygame.Rect(x, y, width, height)
+        self.drawn_color = None# background of the last draw, None forces redraw
+        self.is_hovered = False# set by SudokuGui.update_hover
 
     def get_color(self, color_type: ColorType):
         raise NotImplementedError()
 
-    def process(self, color_type, mouse_pos):
-        if self.rect.collidepoint(mouse_pos) and ColorType.PRESSED != color_type:
+    def invalidate(self):
+        self.drawn_color = None
+
+    def process(self, color_type):
+        """
+            draw only if color or text changed since last draw, returns drawn rect or None
+        """
+        if self.is_hovered and ColorType.PRESSED != color_type:
             color_type = ColorType.HOVER
 
-        self.surface.fill(self.get_color(color_type))
+        color = self.get_color(color_type)
+        if color == self.drawn_color:
+            return None
+        self.drawn_color = color
+
+        self.surface.fill(color)
+        self.draw_content()
+        self.screen_pointer.blit(self.surface, self.rect)
+        return self.rect
+
+    def draw_content(self):
         self.surface.blit(self.font_render, [
             self.rect.width/2 - self.font_render.get_rect().width/2,
             self.rect.height/2 - self.font_render.get_rect().height/2
         ])
-        self.screen_pointer.blit(self.surface, self.rect)
 
 class GridCell(GuiRectangle):
     background_colors = BackgroundColors('#F5EBE0', '#F0DBDB', '#F0E1D1')
@@ -81,35 +141,64 @@ class GridCell(GuiRectangle):
             return ((20,20,20))
 
     def __init__(self,screen_pointer,y,x,height,width,grid_pos_y,grid_pos_x,
-                    cell_data):
-        super().__init__(screen_pointer,y,x,height,width,16, str(cell_data.value) if cell_data.value != 0 else "",is_bold=True)
+                    cell_data, square_size=3):
+        super().__init__(screen_pointer,y,x,height,width,16, str(cell_data.value) if cell_data.value != 0 else "",is_bold=True,
+                    text_color=GridCell.get_text_color(cell_data.cell_type))
         self.cell_data = BoardCell(cell_data.value, cell_data.cell_type)
 
-        self.font_render = self.font.render(str(cell_data.value) if cell_data.value != 0 else "", True, GridCell.get_text_color(cell_data.cell_type))
-
         self.grid_pos_y = grid_pos_y
         self.grid_pos_x = grid_pos_x
 
+        # candidates bitmask shown in empty cell, digits in square_size x square_size small grid
+        self.pencil_marks = 0
+        self.marks_per_line = square_size
+        self.pencil_font_key = ('Arial', max(7, width // square_size - 1), False)
+
     def get_color(self, color_type: ColorType):
         return GridCell.background_colors.get_color(color_type)
 
+    def update_pencil_marks(self, pencil_marks):
+        if pencil_marks != self.pencil_marks:
+            self.pencil_marks = pencil_marks
+            if self.cell_data.value == 0:
+                self.invalidate()
+
+    def draw_content(self):
+        if self.cell_data.value != 0 or self.pencil_marks == 0:
+            super().draw_content()
+            return
+        step = self.rect.width / self.marks_per_line
+        marks = self.pencil_marks
+        digit = 0
+        while marks:
+            if marks & 1:
+                render = font_cache.render(self.pencil_font_key, str(digit + 1), (120,120,120))
+                line, pos = divmod(digit, self.marks_per_line)
+                self.surface.blit(render, [pos*step + step/2 - render.get_width()/2,
+                    line*step + step/2 - render.get_height()/2])
+            marks >>= 1
+            digit += 1
+
     def reset_cell_data(self, new_cell_data :BoardCell):
         self.cell_data.value = new_cell_data.value
         self.cell_data.cell_type = new_cell_data.cell_type
 
-        self.font_render = self.font.render(str(self.cell_data.value) if self.cell_data.value != 0 else "", True, GridCell.get_text_color(self.cell_data.cell_type))
+        self.font_render = font_cache.render(self.font_key, str(self.cell_data.value) if self.cell_data.value != 0 else "",
+            GridCell.get_text_color(self.cell_data.cell_type))
+        self.invalidate()
 
 
     def update_cell_text(self, game_board_value, cell_type: CellType):
-        if game_board_value == 0:
-            return
         if game_board_value != self.cell_data.value or cell_type != self.cell_data.cell_type:
             self.cell_data.value = game_board_value
             self.cell_data.cell_type = cell_type
 
             text_color = GridCell.get_text_color(self.cell_data.cell_type)
 
-            self.font_render = self.font.render(str(self.cell_data.value), True, text_color)
+            # value goes back to 0 when a move is undone
+            self.font_render = font_cache.render(self.font_key, str(self.cell_data.value) if self.cell_data.value != 0 else "",
+                text_color)
+            self.invalidate()
 
 class NumberCell(GuiRectangle):
     background_colors = BackgroundColors('#F0DBDB', '#D0DBDB', '#D9A4A4')
@@ -136,59 +225,76 @@ class GuiButton(GuiRectangle):
         return GuiButton.background_colors.get_color(color_type)
 
 class SudokuGui:
+    # events which can change model or gui state in event driven mode
+    wake_event_types = (pygame.QUIT, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN,
+        pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.USEREVENT)
+    background_color = ((254, 252, 243)) # FEFCF3
+
     def __init__(self, game_board):
         self.fps = 60
+        self.event_wait_timeout = 1000# ms, upper bound of idle sleep
         self.fps_clock = pygame.time.Clock()
-        width_screen, height_screen = 640, 480
-        self.screen = pygame.display.set_mode([width_screen, height_screen])
+        self.size = len(game_board)
+        self.square_size = math.isqrt(self.size)
         self.grid_cells = []
         self.number_cells = []
 
-        # generate board
+        # layout, 9x9 board gives 40px cells and 640x480 window
         grid_cell_margin = 10
-        margin_default = 5
-        width_cell, height_cell = 40, 40
-        for y in range(0,9):
+        margin_default = 5 if self.size <= 9 else 2
+        width_cell = height_cell = max(26, 49 - self.size)
+        # hit-testing finds cells by these instead of checking every rect
+        self.cell_side = width_cell
+        self.cell_pitch = width_cell + margin_default
+        self.grid_origin = (grid_cell_margin, grid_cell_margin)
+        grid_side = self.size * width_cell + margin_default * (self.size-1)
+        num_cell_margin = 10
+        num_cells_pos_y = grid_cell_margin + grid_side + 2*num_cell_margin
+        grid_setting_button_distance = 20
+        setting_button_mergin = 10
+        setting_button_height = 60
+        setting_button_pos_x = num_cell_margin + grid_side + grid_setting_button_distance
+        width_screen = setting_button_pos_x + 200 + 10
+        height_screen = max(num_cells_pos_y + height_cell + num_cell_margin,
+                            grid_cell_margin + 4*setting_button_height + 3*setting_button_mergin + 40)
+        self.screen = pygame.display.set_mode([width_screen, height_screen])
+
+        # generate board
+        for y in range(0,self.size):
             margin_y = 0 if y == 0 else margin_default
             pos_y = y * (height_cell + margin_y) + grid_cell_margin
 
-            for x in range(0,9):
+            for x in range(0,self.size):
                 margin_x = 0 if x == 0 else margin_default
                 pos_x = x * (width_cell + margin_x) + grid_cell_margin
 
                 self.grid_cells.append(GridCell(self.screen,pos_y, pos_x,
-                        height_cell, width_cell, y, x, game_board[y][x]))
+                        height_cell, width_cell, y, x, game_board[y][x], self.square_size))
 
 
         # board grid lines TODO:
         self.grid_lines = list()
         # vertical lines
         grid_line_y_start = grid_cell_margin
-        grid_line_y_end = grid_cell_margin + 9 * height_cell + margin_default * 8
-        for block_num in [3,6]:
+        grid_line_y_end = grid_cell_margin + grid_side
+        for block_num in range(self.square_size, self.size, self.square_size):
             grid_line_x = grid_cell_margin+block_num*width_cell+margin_default*(block_num-1)+margin_default//2
             self.grid_lines.append((grid_line_x,grid_line_y_start,grid_line_x,grid_line_y_end))
 
         # horizontal lines
         grid_line_x_start = grid_cell_margin
-        grid_line_x_end = grid_cell_margin + 9 * width_cell + margin_default * 8
-        for block_num in [3,6]:
+        grid_line_x_end = grid_cell_margin + grid_side
+        for block_num in range(self.square_size, self.size, self.square_size):
             grid_line_y = grid_cell_margin+block_num*height_cell+margin_default*(block_num-1)+margin_default//2
             self.grid_lines.append((grid_line_x_start,grid_line_y,grid_line_x_end,grid_line_y))
 
 
         # cell nums
-        num_cell_margin = 10
-        pos_y = 480 - height_cell - num_cell_margin
-        for num in range(1, 10):
-            margin_x = 0 if x == 0 else 5
-            pos_x = (num-1) * (width_cell + margin_x) + num_cell_margin
-            self.number_cells.append(NumberCell(self.screen,pos_y, pos_x, height_cell, width_cell, num))
+        self.numbers_origin = (num_cell_margin, num_cells_pos_y)
+        for num in range(1, self.size+1):
+            pos_x = (num-1) * (width_cell + margin_default) + num_cell_margin
+            self.number_cells.append(NumberCell(self.screen,num_cells_pos_y, pos_x, height_cell, width_cell, num))
 
-        grid_setting_button_distance = 20
-        setting_button_mergin = 10
-        setting_button_height = 60
-        setting_button_pos_x = pos_x+width_cell+grid_setting_button_distance
         setting_button_pos_y = grid_cell_margin
         self.button_start_reset   = GuiButton(self.screen,setting_button_pos_y,  setting_button_pos_x,
                                             setting_button_height, 200, 'Start/Restart')
@@ -198,12 +304,87 @@ class SudokuGui:
         setting_button_pos_y += setting_button_height+setting_button_mergin
         self.button_check_correct = GuiButton(self.screen,setting_button_pos_y, setting_button_pos_x,
                                             setting_button_height, 120, 'Check', True)
+        setting_button_pos_y += setting_button_height+setting_button_mergin
+        self.button_pencil_marks  = GuiButton(self.screen,setting_button_pos_y, setting_button_pos_x,
+                                            setting_button_height, 120, 'Marks', True)
+
+        self.buttons = [self.button_start_reset, self.button_hint, self.button_check_correct, self.button_pencil_marks]
+        self.gui_elements = self.grid_cells + self.number_cells + self.buttons
+        self.full_redraw = True
+        self.hover_element = None
+        self.hover_position = None
+        # press state of the last draw, elements are redrawn when it moves
+        self.drawn_pressed_position = None
+        self.drawn_current_num = None
+        self.key_actions = []# 'undo'/'redo' of last parsed events
+
+        # frame time text in bottom right corner, not drawn while None
+        self.overlay_rect = pygame.Rect(setting_button_pos_x, height_screen - 30, 200, 20)
+        self.overlay_text = None
+        self.drawn_overlay_text = None
+
+    def invalidate(self):
+        # redraw whole screen on next update_gui
+        self.full_redraw = True
 
     def reset_table(self, game_board):
-        for y in range(0,9):
-            for x in range(0,9):
-                self.grid_cells[y*9+x].reset_cell_data(game_board[y][x])
-
+        for y in range(0,self.size):
+            for x in range(0,self.size):
+                self.grid_cells[y*self.size+x].reset_cell_data(game_board[y][x])
+
+
+    def _cell_index(self, offset):
+        # cell number along one axis or -1 if offset is outside of cells or in a margin between them
+        if offset < 0:
+            return -1
+        index, inside = divmod(offset, self.cell_pitch)
+        if index >= self.size or inside >= self.cell_side:
+            return -1
+        return index
+
+    def element_at(self, mouse_pos):
+        """
+            gui element under mouse_pos or None, same cost for any board size
+        """
+        x, y = mouse_pos
+        col = self._cell_index(x - self.grid_origin[0])
+        if col >= 0:
+            row = self._cell_index(y - self.grid_origin[1])
+            if row >= 0:
+                return self.grid_cells[row*self.size + col]
+
+        num_y = y - self.numbers_origin[1]
+        if 0 <= num_y < self.cell_side:
+            num_index = self._cell_index(x - self.numbers_origin[0])
+            if num_index >= 0:
+                return self.number_cells[num_index]
+
+        for button in self.buttons:
+            if button.rect.collidepoint(mouse_pos):
+                return button
+        return None
+
+    def update_hover(self, mouse_pos):
+        """
+            move hover to element under mouse_pos.
+            returns hover changes as (element, entered) pairs: left element first, then entered one
+        """
+        if mouse_pos == self.hover_position:
+            return []
+        self.hover_position = mouse_pos
+        element = self.element_at(mouse_pos)
+        if element is self.hover_element:
+            return []
+
+        changes = []
+        if self.hover_element is not None:
+            self.hover_element.is_hovered = False
+            changes.append((self.hover_element, False))
+        if element is not None:
+            element.is_hovered = True
+            changes.append((element, True))
+        self.hover_element = element
+        return changes
 
     def check_gui_elements_interaction(self, mouse_pos, is_mouse_pressed):
         mouse_data = MouseData(position=mouse_pos)
@@ -211,168 +392,261 @@ class SudokuGui:
         if is_mouse_pressed:
             mouse_data.pressed = True
 
-            for cell in self.grid_cells:
-                if cell.rect.collidepoint(mouse_pos):
-                    mouse_data.pressed_grid_position = (cell.grid_pos_y, cell.grid_pos_x)
-
-            for number_cell in self.number_cells:
-                if number_cell.rect.collidepoint(mouse_pos):
-                    mouse_data.pressed_number_cell = number_cell.num
-
-            if self.button_hint.rect.collidepoint(mouse_pos):
+            element = self.element_at(mouse_pos)
+            if isinstance(element, GridCell):
+                mouse_data.pressed_grid_position = (element.grid_pos_y, element.grid_pos_x)
+            elif isinstance(element, NumberCell):
+                mouse_data.pressed_number_cell = element.num
+            elif element is self.button_hint:
                 mouse_data.pressed_hint = True
-
-            if self.button_check_correct.rect.collidepoint(mouse_pos):
+            elif element is self.button_check_correct:
                 mouse_data.pressed_check_correct = True
-
-            if self.button_start_reset.rect.collidepoint(mouse_pos):
+            elif element is self.button_pencil_marks:
+                mouse_data.pressed_pencil_marks = True
+            elif element is self.button_start_reset:
                 mouse_data.restart = True
 
+        mouse_data.undo = 'undo' in self.key_actions
+        mouse_data.redo = 'redo' in self.key_actions
         return mouse_data
 
     def check_events(self):
+        return self._parse_events(pygame.event.get())
+
+    def wait_events(self, timeout):
+        """
+            block until mouse, timer or window event or timeout in ms.
+            returns check_events values and whether something may have changed
+        """
+        return self.parse_waited_events(self.wait_for_events(timeout))
+
+    def wait_for_events(self, timeout):
+        if self.full_redraw:
+            # nothing is on screen yet, do not wait for input
+            return pygame.event.get()
+        return [pygame.event.wait(timeout)] + pygame.event.get()
+
+    def parse_waited_events(self, all_events):
+        has_changes = self.full_redraw or any(event.type in SudokuGui.wake_event_types for event in all_events)
+        return self._parse_events(all_events) + (has_changes,)
+
+    def _parse_events(self, all_events):
         is_quit = False
         mouse_pos = None
         is_mouse_pressed = False
+        self.key_actions = []
 
-        all_events = pygame.event.get()
         for event in all_events:
             if event.type == pygame.QUIT:
                 is_quit = True
             if event.type == pygame.MOUSEBUTTONDOWN:
                 is_mouse_pressed = True
+            if event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL:
+                if event.key == pygame.K_y or (event.key == pygame.K_z and event.mod & pygame.KMOD_SHIFT):
+                    self.key_actions.append('redo')
+                elif event.key == pygame.K_z:
+                    self.key_actions.append('undo')
+            if event.type == pygame.VIDEOEXPOSE or event.type == pygame.WINDOWEXPOSED:
+                self.invalidate()
         mouse_pos = pygame.mouse.get_pos()
 
         return is_quit,mouse_pos,is_mouse_pressed
 
-    def update_gui(self, game_board, current_num, mouse_data, highlight_incorrect):
-        mouse_pos = mouse_data.position
-
-        self.screen.fill(((254, 252, 243))) # FEFCF3
+    def update_gui(self, game_board, current_num, mouse_data, highlight_incorrect, pencil_marks=None):
+        self.present(self.draw_gui(game_board, current_num, mouse_data, highlight_incorrect, pencil_marks))
+        self.limit_fps()
+
+    def draw_gui(self, game_board, current_num, mouse_data, highlight_incorrect, pencil_marks=None):
+        """
+            draw changed elements to screen surface, returns their rects or None if whole screen is redrawn.
+            game_board is CompactBoard or nested lists of BoardCell.
+            pencil_marks is SudokuLogic.candidates to show in empty cells, None hides them
+        """
+        full_redraw = self.full_redraw
+        dirty_rects = []
+        if hasattr(game_board, 'get_value'):
+            get_value, get_cell_type = game_board.get_value, game_board.get_cell_type
+        else:
+            # nested lists of BoardCell
+            get_value = lambda y, x: game_board[y][x].value
+            get_cell_type = lambda y, x: game_board[y][x].cell_type
+        # elements to process: hover changes, then everything whose look may have changed
+        changed = [element for element, _ in self.update_hover(mouse_data.position)]
+
+        if full_redraw:
+            self.screen.fill(SudokuGui.background_color)
+            for element in self.gui_elements:
+                element.invalidate()
+            changed.extend(self.gui_elements)
 
         for btn in self.grid_cells:
             # check if y and x coordinates same as in gui
-            game_board_value = game_board[btn.grid_pos_y][btn.grid_pos_x].value
-            btn.update_cell_text(game_board_value, game_board[btn.grid_pos_y][btn.grid_pos_x].cell_type)
-
-            fill_type = ColorType.PRESSED if mouse_data.pressed_grid_position is not None\
-                and mouse_data.pressed_grid_position == (btn.grid_pos_y,btn.grid_pos_x)\
-                else ColorType.NORMAL
-            btn.process(fill_type, mouse_pos)
-
-        for (x_start,y_start,x_end,y_end) in self.grid_lines:
-            pygame.draw.line(self.screen, (0,0,0), (x_start,y_start),(x_end,y_end), 1)
-
-        for num_cell in self.number_cells:
-            fill_type = ColorType.PRESSED if current_num == num_cell.num else ColorType.NORMAL
-            num_cell.process(fill_type, mouse_pos)
-
-        # gui buttons
-        self.button_start_reset.process(ColorType.NORMAL, mouse_pos)
-
-        self.button_hint.process(ColorType.NORMAL, mouse_pos)
-
-        self.button_check_correct.is_active = highlight_incorrect
-        self.button_check_correct.process(ColorType.NORMAL, mouse_pos)
-
-        pygame.display.flip()
+            game_board_value = get_value(btn.grid_pos_y, btn.grid_pos_x)
+            btn.update_cell_text(game_board_value, get_cell_type(btn.grid_pos_y, btn.grid_pos_x))
+            btn.update_pencil_marks(pencil_marks[btn.grid_pos_y*self.size + btn.grid_pos_x]
+                if pencil_marks is not None and game_board_value == 0 else 0)
+            if btn.drawn_color is None:# text or marks changed
+                changed.append(btn)
+
+        pressed_position = mouse_data.pressed_grid_position
+        if pressed_position != self.drawn_pressed_position:
+            for position in (self.drawn_pressed_position, pressed_position):
+                if position is not None:
+                    changed.append(self.grid_cells[position[0]*self.size + position[1]])
+            self.drawn_pressed_position = pressed_position
+
+        if current_num != self.drawn_current_num:
+            for num in (self.drawn_current_num, current_num):
+                if num is not None and 1 <= num <= self.size:
+                    changed.append(self.number_cells[num - 1])
+            self.drawn_current_num = current_num
+
+        for button, is_active in ((self.button_check_correct, highlight_incorrect),
+                                    (self.button_pencil_marks, pencil_marks is not None)):
+            if button.is_active != is_active:
+                button.is_active = is_active
+                changed.append(button)
+
+        for element in dict.fromkeys(changed):# in order, once each
+            if isinstance(element, GridCell):
+                is_pressed = pressed_position == (element.grid_pos_y, element.grid_pos_x)
+            else:
+                is_pressed = isinstance(element, NumberCell) and element.num == current_num
+            dirty_rects.append(element.process(ColorType.PRESSED if is_pressed else ColorType.NORMAL))
+
+        if full_redraw:
+            # lines are in margins between cells, cell redraws do not cover them
+            for (x_start,y_start,x_end,y_end) in self.grid_lines:
+                pygame.draw.line(self.screen, (0,0,0), (x_start,y_start),(x_end,y_end), 1)
+
+        if self.overlay_text is not None and (full_redraw or self.overlay_text != self.drawn_overlay_text):
+            self.drawn_overlay_text = self.overlay_text
+            self.screen.fill(SudokuGui.background_color, self.overlay_rect)
+            # text changes every update, not worth keeping in font_cache renders
+            self.screen.blit(font_cache.get_font(('Arial', 14, False)).render(self.overlay_text, True, (20,20,20)),
+                self.overlay_rect)
+            dirty_rects.append(self.overlay_rect)
+
+        if full_redraw:
+            self.full_redraw = False
+            return None
+        return [rect for rect in dirty_rects if rect is not None]
+
+    def present(self, dirty_rects):
+        # dirty_rects from draw_gui, None shows whole screen
+        if dirty_rects is None:
+            pygame.display.flip()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+
+    def limit_fps(self):
         self.fps_clock.tick(self.fps)
 
     #def write_notification():
     #    pass
 
-class SudokuLogic():
-    def __init__(self):
-        self.solved_board = generate_sudoku_board()
-
-        if False == checkRowsCols(self.solved_board) or False == checkSquares(self.solved_board):
-            raise Exception("board generation failed")
-        self.clear_table = get_clear_table(percent_clear=10)# erase some numbers
-
-        #self.game_board = [[el_b*el_c for el_b,el_c in zip(row_board,row_clear)]
-        #        for row_board,row_clear in zip(self.solved_board,self.clear_table)]
-        self.game_board = [[BoardCell(el_b*el_c, CellType.CHANGEABLE if el_c == 0 else CellType.NON_CHANGEABLE)
-            for el_b,el_c in zip(row_board,row_clear)]
-                for row_board,row_clear in zip(self.solved_board,self.clear_table)]
-
-
-    def update_cell(self, grid_pos_y,grid_pos_x, cell_value):
-        cell_type = self.game_board[grid_pos_y][grid_pos_x].cell_type
-        if cell_type == CellType.CHANGEABLE or cell_type == CellType.CHECKED_WRONG:
-            self.game_board[grid_pos_y][grid_pos_x].value = cell_value
-
-    def add_hint_value(self):
-        # find a value which is in solved_board, but not in game_board yet
-        for y in range(9):
-            for x in range(9):
-                if self.game_board[y][x].value != self.solved_board[y][x]:
-                    self.game_board[y][x].value = self.solved_board[y][x]
-                    self.game_board[y][x].cell_type = CellType.HINTED
-
-                    return
-
-    def update_correct_values(self, highlight_incorrect):
-        for y in range(9):
-            for x in range(9):
-                cell_type = self.game_board[y][x].cell_type
-                if cell_type == CellType.CHANGEABLE or cell_type == CellType.CHECKED_WRONG:
-                    if highlight_incorrect:
-                        if self.game_board[y][x].value != 0:
-                            if self.game_board[y][x].value != self.solved_board[y][x]:
-                                self.game_board[y][x].cell_type = CellType.CHECKED_WRONG
-                            else:
-                                self.game_board[y][x].cell_type = CellType.CHANGEABLE
-                    else:
-                        self.game_board[y][x].cell_type = CellType.CHANGEABLE
-
-    def is_puzzle_solved(self):
-        game_board_values = [[el.value
-            for el in row_board]
-                for row_board in self.game_board]
-        if checkRowsCols(game_board_values) and checkSquares(game_board_values):
-            return True
-        return False
-
 # controller
 class SudokuGame():
-    def __init__(self):
+    def __init__(self, event_driven=True, square_size=3, puzzle_bank_path=None, difficulty=None, prefetch_depth=2,
+                    frame_timer=None, frame_overlay=False, session_path=None):
         pygame.init()
         self.running = True
+        # sleep until input instead of polling every frame
+        self.event_driven = event_driven
+        self.square_size = square_size
+
+        # pre-generated puzzles, games are generated on the spot without it
+        self.puzzle_bank = PuzzleBank(puzzle_bank_path) if puzzle_bank_path is not None else None
+        self.difficulty = difficulty
+        if self.puzzle_bank is not None:
+            self.square_size = self.puzzle_bank.square_size
         self.current_number = None
         self.highlight_incorrect = False
+        self.show_pencil_marks = False
+
+        # FrameTimer of run_game stages, None turns timing off
+        self.frame_timer = frame_timer
+        self.frame_overlay = frame_overlay and frame_timer is not None
+        self.overlay_interval = 15# frames between overlay text updates
+
+        # unfinished game is saved here on exit and resumed on next start
+        self.session_path = session_path
+        if session_path is not None and os.path.exists(session_path):
+            self.sudoku_model = SudokuLogic.load_session(session_path)
+            self.square_size = self.sudoku_model.square_size
+            self.highlight_incorrect = self.sudoku_model.highlight_incorrect
+        else:
+            self.create_game_model()
 
-        self.create_game_model()
+        # next games are generated in background, bank picks are fast enough without it
+        self.prefetcher = None
+        if self.puzzle_bank is None and prefetch_depth > 0:
+            self.prefetcher = SudokuPrefetcher(prefetch_depth, square_size=self.square_size)
 
         # create gui
         self.sudoku_gui = SudokuGui(self.sudoku_model.game_board)
+        if self.event_driven:
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed(list(SudokuGui.wake_event_types))
 
     def run_game(self):
         # start a game
         # run gui cycle
+        timer = self.frame_timer
         while self.running:
             # check if quit clicked
-            is_quit, mouse_pos, is_mouse_pressed = self.sudoku_gui.check_events()
+            if self.event_driven:
+                # time asleep in wait is not part of the frame
+                all_events = self.sudoku_gui.wait_for_events(self.sudoku_gui.event_wait_timeout)
+                if timer is not None:
+                    timer.start_frame()
+                is_quit, mouse_pos, is_mouse_pressed, has_changes = self.sudoku_gui.parse_waited_events(all_events)
+            else:
+                if timer is not None:
+                    timer.start_frame()
+                is_quit, mouse_pos, is_mouse_pressed = self.sudoku_gui.check_events()
+                has_changes = True
             if is_quit:
                 self.running = False
+                if timer is not None:
+                    timer.cancel_frame()
                 # program exit
                 break
 
+            if not has_changes:
+                # idle wake up, nothing to update
+                if timer is not None:
+                    timer.cancel_frame()
+                continue
+            if timer is not None:
+                timer.mark()# events
+
             # get data of mouse event
             mouse_data = self.sudoku_gui.check_gui_elements_interaction(mouse_pos, is_mouse_pressed)
+            if timer is not None:
+                timer.mark()# interaction
 
             if mouse_data.restart:
                 self.restart_game()
 
             # check results in model
             if mouse_data.pressed_hint:
-                # get non-cleared value
-                self.sudoku_model.add_hint_value()
+                # fill next cell which can be deduced
+                hint = self.sudoku_model.add_hint_value()
+                if hint is not None:
+                    self.log_callback("hint: row %d col %d is %d (%s)" % (hint.cell // self.sudoku_model.size + 1,
+                        hint.cell % self.sudoku_model.size + 1, hint.value, hint.technique))
+
+            if mouse_data.pressed_pencil_marks:
+                self.show_pencil_marks = not self.show_pencil_marks
 
             if mouse_data.pressed_check_correct:
                 self.highlight_incorrect = not self.highlight_incorrect
 
-            self.sudoku_model.update_correct_values(self.highlight_incorrect)
-
+            if mouse_data.undo:
+                self.sudoku_model.undo()
+            if mouse_data.redo:
+                self.sudoku_model.redo()
 
             if mouse_data.pressed_grid_position is not None:
                 grid_pos_y,grid_pos_x = mouse_data.pressed_grid_position
@@ -383,18 +657,44 @@ class SudokuGame():
                 self.current_number = mouse_data.pressed_number_cell
                 #self.log_callback("chosen number: " + str(self.current_number))
 
+            # after cell, undo/redo and hint changes, the next frame may come only after a long wait
+            self.sudoku_model.update_correct_values(self.highlight_incorrect)
+
+            # check if game completed, last frame is still drawn
+            is_solved = self.sudoku_model.is_puzzle_solved()
+            if timer is not None:
+                timer.mark()# model
+
             # update gui
-            self.sudoku_gui.update_gui(self.sudoku_model.game_board,
+            dirty_rects = self.sudoku_gui.draw_gui(self.sudoku_model.game_board,
                 self.current_number,
-                mouse_data, self.highlight_incorrect)
-
-            # check if game completed
-            if self.sudoku_model.is_puzzle_solved():
+                mouse_data, self.highlight_incorrect,
+                self.sudoku_model.candidates if self.show_pencil_marks else None)
+            if timer is not None:
+                timer.mark()# render
+            self.sudoku_gui.present(dirty_rects)
+            if timer is not None:
+                timer.mark()# present
+                if self.frame_overlay and timer.num_frames % self.overlay_interval == 0:
+                    self.sudoku_gui.overlay_text = timer.overlay_text()
+            self.sudoku_gui.limit_fps()
+
+            if is_solved:
                 self.log_callback("congratulations")
                 self.running = False
                 break
 
+        if self.session_path is not None:
+            if self.sudoku_model.is_puzzle_solved():
+                if os.path.exists(self.session_path):
+                    os.remove(self.session_path)
+            else:
+                self.sudoku_model.save_session(self.session_path)
         self.log_callback("finish game")
+        if self.puzzle_bank is not None:
+            self.puzzle_bank.close()
+        if self.prefetcher is not None:
+            self.prefetcher.close()
         pygame.quit()
 
     def log_callback(self, log_text):
@@ -402,15 +702,34 @@ class SudokuGame():
 
     def create_game_model(self):
         try:
-            self.sudoku_model = SudokuLogic()
+            bank_puzzle = None
+            if self.puzzle_bank is not None:
+                bank_puzzle = self.puzzle_bank.random_puzzle(difficulty=self.difficulty)
+                if bank_puzzle is None:
+                    self.log_callback("no " + str(self.difficulty) + " puzzles in bank, generating")
+            if bank_puzzle is not None:
+                puzzle, solution, _, _ = bank_puzzle
+                self.sudoku_model = SudokuLogic(puzzle, solution=solution)
+            else:
+                self.sudoku_model = SudokuLogic(square_size=self.square_size)
         except Exception as e:
             print(e)
             self.running = False
 
     def restart_game(self):
-        del self.sudoku_model
         # create new game model
-        self.create_game_model()
+        if self.prefetcher is not None:
+            try:
+                self.sudoku_model, wait_time = self.prefetcher.take()
+            except Exception as e:
+                self.log_callback("prefetched game failed (" + repr(e) + "), generating one here")
+                self.create_game_model()
+            else:
+                if wait_time > 0:
+                    self.log_callback("restart waited %.1f ms for a new game (ready games: %d)" %
+                        (wait_time * 1000, self.prefetcher.stats.last_depth))
+        else:
+            self.create_game_model()
 
         # reset gui values
         self.sudoku_gui.reset_table(self.sudoku_model.game_board)
@@ -421,5 +740,28 @@ class SudokuGame():
     #    pass
 
 if __name__ == "__main__":
-    game = SudokuGame()
+    parser = argparse.ArgumentParser(description="sudoku game")
+    parser.add_argument('--square-size', type=int, default=3, choices=[2,3,4,5],
+                        help="box side, 3 for 9x9 board, 4 for 16x16, 5 for 25x25")
+    parser.add_argument('--bank', default=None, help="puzzle bank file made with puzzle_bank.py")
+    parser.add_argument('--difficulty', default=None, choices=list(dict.fromkeys(DIFFICULTIES)),
+                        help="difficulty of bank puzzles, any if not set")
+    parser.add_argument('--session', default=None, help="resume game from this file and save it there on exit")
+    parser.add_argument('--frame-overlay', action='store_true', help="show p50/p99 frame time on screen")
+    parser.add_argument('--frame-stats', default=None,
+                        help="write per-stage frame times on exit, .json or .csv by extension")
+    parser.add_argument('--profile-stage', default=None, choices=STAGES, help="run cProfile during this stage")
+    parser.add_argument('--profile-output', default=None,
+                        help="pstats file for --profile-stage, top functions are printed without it")
+    args = parser.parse_args()
+
+    frame_timer = None
+    if args.frame_overlay or args.frame_stats or args.profile_stage:
+        frame_timer = FrameTimer(profile_stage=args.profile_stage)
+    game = SudokuGame(square_size=args.square_size, puzzle_bank_path=args.bank, difficulty=args.difficulty,
+                        frame_timer=frame_timer, frame_overlay=args.frame_overlay, session_path=args.session)
     game.run_game()
+    if frame_timer is not None:
+        if args.frame_stats:
+            frame_timer.export(args.frame_stats)
+        frame_timer.dump_profile(args.profile_output)
@@ -0,0 +1,346 @@
+"""
+    binary bank of pre-generated puzzles, read through mmap
+
+    bank file: 16 bytes header, then fixed-size records
+        solution        size*size bytes, one digit per byte
+        clue mask       bit per cell, set if the cell is a clue
+        level           1 byte, sudoku_rating level
+        steps           2 bytes, sudoku_rating steps
+        clues           2 bytes, number of clues
+    index file (bank path + '.idx'): 16 bytes header, bucket starts for every
+    (level, clues) pair as prefix sums, then record numbers sorted by (level, clues).
+    picking a random puzzle reads a few bytes of both files, whatever the bank size.
+
+    appended puzzles are deduplicated by canonical form (sudoku_canon) against hashes
+    of all puzzles ever appended, kept in bank path + '.hashes'
+
+    python puzzle_bank.py append bank.sdk -n 10000 --clues 26
+    python sudoku_cli.py generate -n 100 | python puzzle_bank.py append bank.sdk
+    python puzzle_bank.py info bank.sdk
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+from functools import partial
+
+import numpy as np
+
+from sudoku_utils import generate_puzzle, generate_stream, board_from_line
+from sudoku_solver import solve_board, count_solutions
+from sudoku_rating import rate_board, TECHNIQUES, DIFFICULTIES, SEARCH_LEVEL
+from sudoku_canon import PuzzleHashSet, canonical_hashes, hash_batches, dedupe_batches, MAX_SQUARE_SIZE
+
+BANK_MAGIC = b'SDKB'
+INDEX_MAGIC = b'SDKI'
+VERSION = 1
+HEADER_SIZE = 16
+NUM_LEVELS = SEARCH_LEVEL + 1
+
+_bank_header = struct.Struct('<4sBBHI4x')# magic, version, square_size, record_size, reserved
+_index_header = struct.Struct('<4sBBxxI4x')# magic, version, square_size, num_records
+_uint32 = struct.Struct('<I')
+_record_tail = struct.Struct('<BHH')# level, steps, clues
+
+def _record_size(square_size):
+    num_cells = square_size**4
+    return num_cells + (num_cells + 7) // 8 + _record_tail.size
+
+def _to_le_bytes(values):
+    numbers = array('I', values)
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    return numbers.tobytes()
+
+def pack_record(solved_board, clear_table, rating):
+    num_cells = len(solved_board)**2
+    mask = bytearray((num_cells + 7) // 8)
+    clues = 0
+    for i, clear in enumerate(el for row in clear_table for el in row):
+        if clear:
+            mask[i >> 3] |= 1 << (i & 7)
+            clues += 1
+    return bytes(el for row in solved_board for el in row) + bytes(mask) +\
+        _record_tail.pack(rating.level, min(rating.steps, 0xFFFF), clues)
+
+class PuzzleBank:
+    """
+        read-only view of bank and index files, nothing is loaded up front
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as bank_file:
+            self.bank_map = mmap.mmap(bank_file.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(path + '.idx', 'rb') as index_file:
+            self.index_map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.square_size, self.record_size, _ = _bank_header.unpack_from(self.bank_map, 0)
+        if magic != BANK_MAGIC or version != VERSION:
+            raise Exception("not a puzzle bank: " + path)
+        magic, version, index_square_size, self.num_records = _index_header.unpack_from(self.index_map, 0)
+        if magic != INDEX_MAGIC or version != VERSION or index_square_size != self.square_size:
+            raise Exception("bad puzzle bank index: " + path + '.idx')
+
+        self.size = self.square_size * self.square_size
+        self.num_cells = self.size * self.size
+        self.num_clue_counts = self.num_cells + 1
+        self.records_offset = HEADER_SIZE + _uint32.size * (NUM_LEVELS * self.num_clue_counts + 1)
+
+    def close(self):
+        self.bank_map.close()
+        self.index_map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.num_records
+
+    def _bucket_start(self, level, clues):
+        return _uint32.unpack_from(self.index_map, HEADER_SIZE + _uint32.size * (level*self.num_clue_counts + clues))[0]
+
+    def _level_range(self, level, min_clues, max_clues):
+        return self._bucket_start(level, min_clues), self._bucket_start(level, max_clues + 1)
+
+    def count(self, level, min_clues=0, max_clues=None):
+        if max_clues is None:
+            max_clues = self.num_cells
+        start, end = self._level_range(level, min_clues, max_clues)
+        return end - start
+
+    def get(self, record_number):
+        """
+            returns (puzzle, solution, level, steps) as 2D boards
+        """
+        offset = HEADER_SIZE + record_number * self.record_size
+        record = self.bank_map[offset:offset + self.record_size]
+        solution = record[:self.num_cells]
+        mask = record[self.num_cells:self.record_size - _record_tail.size]
+        level, steps, _ = _record_tail.unpack_from(record, self.record_size - _record_tail.size)
+
+        puzzle = [solution[i] if mask[i >> 3] & (1 << (i & 7)) else 0 for i in range(self.num_cells)]
+        size = self.size
+        return ([puzzle[size*n:size*n+size] for n in range(size)],
+            [list(solution[size*n:size*n+size]) for n in range(size)], level, steps)# 1D -> 2D
+
+    def random_puzzle(self, difficulty=None, level=None, min_clues=0, max_clues=None):
+        """
+            random record with given difficulty name or level and clue range, O(1) in bank size.
+            returns get() result or None if there is no such puzzle
+        """
+        if max_clues is None:
+            max_clues = self.num_cells
+        if level is not None:
+            levels = [level]
+        elif difficulty is not None:
+            levels = [lvl for lvl, name in enumerate(DIFFICULTIES) if name == difficulty]
+        else:
+            levels = range(NUM_LEVELS)
+
+        ranges = [self._level_range(lvl, min_clues, max_clues) for lvl in levels]
+        total = sum(end - start for start, end in ranges)
+        if total == 0:
+            return None
+        pick = random.randrange(total)
+        for start, end in ranges:
+            if pick < end - start:
+                position = start + pick
+                break
+            pick -= end - start
+
+        record_number = _uint32.unpack_from(self.index_map, self.records_offset + _uint32.size * position)[0]
+        return self.get(record_number)
+
+def append_records(path, records, square_size=3):
+    """
+        append packed records to bank file, creates it if needed. index is not updated
+    """
+    record_size = _record_size(square_size)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        with open(path, 'wb') as bank_file:
+            bank_file.write(_bank_header.pack(BANK_MAGIC, VERSION, square_size, record_size, 0))
+    else:
+        with open(path, 'rb') as bank_file:
+            magic, version, bank_square_size, _, _ = _bank_header.unpack(bank_file.read(HEADER_SIZE))
+        if magic != BANK_MAGIC or version != VERSION or bank_square_size != square_size:
+            raise Exception("can not append to " + path)
+
+    num_appended = 0
+    with open(path, 'ab') as bank_file:
+        for record in records:
+            bank_file.write(record)
+            num_appended += 1
+    return num_appended
+
+def _num_records(path, square_size):
+    if not os.path.exists(path):
+        return 0
+    return max(0, os.path.getsize(path) - HEADER_SIZE) // _record_size(square_size)
+
+def build_index(path):
+    """
+        counting sort of all records by (level, clues), written to path + '.idx'
+    """
+    with open(path, 'rb') as bank_file:
+        bank_map = mmap.mmap(bank_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        _, _, square_size, record_size, _ = _bank_header.unpack_from(bank_map, 0)
+        num_records = (len(bank_map) - HEADER_SIZE) // record_size
+        num_clue_counts = square_size**4 + 1
+
+        keys = array('I')
+        tail_offset = HEADER_SIZE + record_size - _record_tail.size
+        for n in range(num_records):
+            level, _, clues = _record_tail.unpack_from(bank_map, tail_offset + n * record_size)
+            keys.append(level * num_clue_counts + clues)
+    finally:
+        bank_map.close()
+
+    num_buckets = NUM_LEVELS * num_clue_counts
+    starts = [0] * (num_buckets + 1)
+    for key in keys:
+        starts[key + 1] += 1
+    for bucket in range(num_buckets):
+        starts[bucket + 1] += starts[bucket]
+    positions = starts[:-1]
+    record_numbers = [0] * num_records
+    for n, key in enumerate(keys):
+        record_numbers[positions[key]] = n
+        positions[key] += 1
+
+    # write next to old index and swap, readers keep the old file mapped
+    tmp_path = path + '.idx.tmp'
+    with open(tmp_path, 'wb') as index_file:
+        index_file.write(_index_header.pack(INDEX_MAGIC, VERSION, square_size, num_records))
+        index_file.write(_to_le_bytes(starts))
+        index_file.write(_to_le_bytes(record_numbers))
+    os.replace(tmp_path, path + '.idx')
+    return num_records
+
+def _generate_record_task(args):
+    target_clues, square_size = args
+    solved_board, clear_table = generate_puzzle(target_clues, square_size)
+    puzzle = [[el_b*el_c for el_b,el_c in zip(row_board,row_clear)]
+        for row_board,row_clear in zip(solved_board,clear_table)]
+    return pack_record(solved_board, clear_table, rate_board(puzzle))
+
+def generate_records(n, workers=None, target_clues=30, square_size=3):
+    """
+        yield n packed records, generated and rated on a process pool in chunks
+    """
+    return generate_stream(n, workers, target_clues, square_size, task=_generate_record_task)
+
+def records_from_lines(lines, square_size=3, errors=sys.stderr):
+    """
+        yield packed records for puzzle lines, puzzles without unique solution are skipped
+    """
+    for line_number, line in enumerate(lines, 1):
+        puzzle = board_from_line(line)
+        if puzzle is None or len(puzzle) != square_size*square_size or count_solutions(puzzle, limit=2) != 1:
+            errors.write("line " + str(line_number) + ": skipped, not a unique-solution puzzle\n")
+            continue
+        clear_table = [[1 if el else 0 for el in row] for row in puzzle]
+        yield pack_record(solve_board(puzzle), clear_table, rate_board(puzzle))
+
+def _record_hashes(records, square_size):
+    # canonical hashes of puzzles in list of packed records
+    size = square_size * square_size
+    num_cells = size * size
+    data = np.frombuffer(b''.join(records), dtype=np.uint8).reshape(len(records), -1)
+    masks = np.unpackbits(data[:, num_cells:num_cells + (num_cells + 7) // 8], axis=1, bitorder='little')
+    return canonical_hashes(data[:, :num_cells].reshape(-1, size, size), masks[:, :num_cells])
+
+def _read_record_batches(bank_file, record_size, batch_size):
+    while True:
+        data = bank_file.read(record_size * batch_size)
+        if not data:
+            return
+        yield [data[n:n + record_size] for n in range(0, len(data) - record_size + 1, record_size)]
+
+def open_hash_set(path, batch_size=1024, workers=1):
+    """
+        PuzzleHashSet of bank, hashes of already stored puzzles are added if the set is new
+    """
+    hash_path = path + '.hashes'
+    is_new = not os.path.exists(hash_path)
+    hash_set = PuzzleHashSet(hash_path)
+    if is_new and os.path.exists(path) and os.path.getsize(path) > HEADER_SIZE:
+        with open(path, 'rb') as bank_file:
+            _, _, square_size, record_size, _ = _bank_header.unpack(bank_file.read(HEADER_SIZE))
+            for _, hashes in hash_batches(_read_record_batches(bank_file, record_size, batch_size),
+                    partial(_record_hashes, square_size=square_size), workers):
+                hash_set.add_new(hashes)
+        hash_set.commit()
+        hash_set.num_repeats = 0
+    return hash_set
+
+def dedupe_records(records, square_size, hash_set, batch_size=256, workers=1):
+    """
+        yield packed records whose puzzle is not in hash_set yet, they are added to it.
+        hash_set.commit() writes their hashes after the records are stored
+    """
+    return dedupe_batches(records, hash_set, partial(_record_hashes, square_size=square_size), batch_size, workers)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="build and inspect puzzle bank files")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    append_parser = subparsers.add_parser('append', help="append puzzles and rebuild index")
+    append_parser.add_argument('path')
+    append_parser.add_argument('-n', type=int, default=None,
+                                help="generate n puzzles, without it puzzle lines are read from stdin")
+    append_parser.add_argument('--clues', type=int, default=30, help="target clue count")
+    append_parser.add_argument('--square-size', type=int, default=3, choices=[2,3,4,5])
+    append_parser.add_argument('--workers', type=int, default=None, help="processes, default all cores")
+    append_parser.add_argument('--no-dedupe', action='store_true', help="append puzzles seen before too")
+
+    info_parser = subparsers.add_parser('info', help="print puzzle counts per level")
+    info_parser.add_argument('path')
+
+    args = parser.parse_args(argv)
+    if args.command == 'append':
+        square_size = args.square_size
+        if args.n is not None:
+            records = generate_records(args.n, args.workers, args.clues, square_size)
+        else:
+            if os.path.exists(args.path) and os.path.getsize(args.path) > 0:
+                # lines must match square size of the existing bank
+                with open(args.path, 'rb') as bank_file:
+                    square_size = _bank_header.unpack(bank_file.read(HEADER_SIZE))[2]
+            records = records_from_lines((line for line in sys.stdin if line.strip()), square_size)
+        hash_set = None
+        if not args.no_dedupe:
+            if square_size <= MAX_SQUARE_SIZE:
+                hash_set = open_hash_set(args.path, workers=args.workers)
+                records = dedupe_records(records, square_size, hash_set, workers=args.workers)
+            else:
+                sys.stderr.write("no dedupe for square size " + str(square_size) + "\n")
+        num_before = _num_records(args.path, square_size)
+        try:
+            num_appended = append_records(args.path, records, square_size)
+        finally:
+            if hash_set is not None:
+                # hashes only of records which are in the bank, also if appending was interrupted
+                hash_set.commit(_num_records(args.path, square_size) - num_before)
+        num_records = build_index(args.path)
+        print("appended", num_appended, "puzzles, bank has", num_records)
+        if hash_set is not None and hash_set.num_repeats:
+            print("skipped", hash_set.num_repeats, "puzzles already in bank")
+    else:
+        with PuzzleBank(args.path) as bank:
+            print("puzzles:", len(bank), " board:", str(bank.size) + "x" + str(bank.size))
+            for level in range(NUM_LEVELS):
+                count = bank.count(level)
+                if count:
+                    print("level %d %-8s %-18s %d" % (level, DIFFICULTIES[level],
+                        'search' if level == SEARCH_LEVEL else TECHNIQUES[level], count))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
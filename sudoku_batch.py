@@ -0,0 +1,85 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from sudoku_utils import fill_random_grid
+
+@dataclass
+class BatchErrors:
+    # True where the unit of the board is invalid, shape (N, size)
+    rows: np.ndarray
+    cols: np.ndarray
+    boxes: np.ndarray
+
+def _bit_table(size):
+    """
+        value -> digit bit lookup for every uint8 value, out of range values map to 0
+    """
+    dtype = np.uint16 if size <= 16 else np.uint32
+    table = np.zeros(256, dtype=dtype)
+    table[1:size+1] = [1 << d for d in range(size)]
+    return table
+
+def check_boards(boards, return_errors=False):
+    """
+        vectorized checkRowsCols + checkSquares for (N, size, size) uint8 array.
+        returns bool array of length N, with return_errors=True also BatchErrors
+    """
+    boards = np.asarray(boards, dtype=np.uint8)
+    if boards.ndim == 2:
+        boards = boards[np.newaxis]
+    num_boards, size = boards.shape[0], boards.shape[1]
+    square_size = math.isqrt(size)
+
+    table = _bit_table(size)
+    full_mask = table.dtype.type((1 << size) - 1)
+    bits = table[boards]
+
+    # size cells with or-ed bits equal to full mask means every digit is there once
+    rows_ok = np.bitwise_or.reduce(bits, axis=2) == full_mask
+    cols_ok = np.bitwise_or.reduce(bits, axis=1) == full_mask
+    boxes = bits.reshape(num_boards, square_size, square_size, square_size, square_size)
+    boxes_ok = (np.bitwise_or.reduce(np.bitwise_or.reduce(boxes, axis=4), axis=2) == full_mask)\
+        .reshape(num_boards, size)
+
+    valid = rows_ok.all(axis=1) & cols_ok.all(axis=1) & boxes_ok.all(axis=1)
+    if return_errors:
+        return valid, BatchErrors(~rows_ok, ~cols_ok, ~boxes_ok)
+    return valid
+
+def _random_line_orders(rng, n, square_size):
+    # (n, size) row orders keeping bands together: bands shuffled, rows shuffled inside bands
+    bands = rng.permuted(np.tile(np.arange(square_size), (n, 1)), axis=1)
+    band_rows = rng.permuted(np.tile(np.arange(square_size), (n, square_size, 1)), axis=2)
+    return (bands[:, :, np.newaxis] * square_size + band_rows).reshape(n, -1)
+
+def generate_grid_batch(n, square_size=3, transforms_per_fill=64, rng=None):
+    """
+        n solved grids as (n, size, size) uint8 array. like sudoku_utils.generate_grids every
+        transforms_per_fill grids are random symmetries of one fill_random_grid, but symmetries
+        and the check (check_boards) run on the whole batch. rng is numpy Generator of symmetries.
+        the fills are still made one by one, a batch has only n / transforms_per_fill
+        essentially different grids
+    """
+    if transforms_per_fill < 1:
+        raise ValueError("transforms_per_fill must be at least 1")
+    rng = np.random.default_rng() if rng is None else rng
+    size = square_size * square_size
+    num_fills = -(-n // transforms_per_fill)
+    fills = np.frombuffer(b''.join(fill_random_grid(square_size) for _ in range(num_fills)), dtype=np.uint8)
+    grids = fills.reshape(num_fills, size, size)[np.arange(n) // transforms_per_fill]
+
+    grids = np.take_along_axis(grids, _random_line_orders(rng, n, square_size)[:, :, np.newaxis], axis=1)
+    grids = np.take_along_axis(grids, _random_line_orders(rng, n, square_size)[:, np.newaxis, :], axis=2)
+    transposed = rng.random(n) < 0.5
+    grids[transposed] = grids[transposed].transpose(0, 2, 1)
+
+    # digit relabeling, label table of every grid has 0 at index 0
+    labels = np.zeros((n, size + 1), dtype=np.uint8)
+    labels[:, 1:] = rng.permuted(np.tile(np.arange(1, size + 1, dtype=np.uint8), (n, 1)), axis=1)
+    grids = np.take_along_axis(labels, grids.reshape(n, -1), axis=1).reshape(n, size, size)
+
+    if not check_boards(grids).all():
+        raise Exception("grid generation failed")
+    return grids
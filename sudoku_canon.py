@@ -0,0 +1,345 @@
+"""
+    canonical form of solved grids and puzzles under the full sudoku symmetry group:
+    band, stack, row and col permutations, transpose and digit relabeling.
+
+    canonical grid is the lexicographically smallest grid of the orbit relabeled so that
+    its first box reads 1..size (close to minlex, which labels by the first row instead).
+    every arrangement of the first box (orientation, box, its row and col order) fixes
+    the labels, the rest of the smallest arrangement follows from it: cols are sorted
+    by row 1 and rows by col 1, as rows and cols of a grid differ in every cell.
+    so the canonical grid is the smallest of 2*size*(square_size!)**2 candidates, 648 for 9x9.
+    candidates of a batch of grids are compared with numpy row by row,
+    only the ones tied on the smallest rows so far are carried to the next row.
+
+    puzzle is canonized by its solution; candidates giving the same grid are automorphisms
+    of it, the smallest clue mask they give makes the puzzle form exact.
+"""
+import hashlib
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+
+import numpy as np
+
+# candidates grow as (square_size!)**2, 25x25 boards would need 720000 per grid
+MAX_SQUARE_SIZE = 4
+HASH_SIZE = 8
+# elements of per-candidate arrays of one block of boards
+_block_elements = 1 << 22
+
+_tables = {}
+
+class _CanonTables:
+    """
+        index tables of all first box arrangements for one square size,
+        cell indexes are into board and its transpose one after another
+    """
+    def __init__(self, square_size):
+        size = square_size * square_size
+        num_cells = size * size
+        self.square_size = square_size
+        self.size = size
+        self.num_cells = num_cells
+
+        orientations = []
+        box_cells = []
+        row_keys = []
+        orders = list(permutations(range(square_size)))
+        for orientation in (0, 1):
+            for band in range(square_size):
+                for stack in range(square_size):
+                    for row_order in orders:
+                        for col_order in orders:
+                            orientations.append(orientation)
+                            box_cells.append([orientation*num_cells + (band*square_size + r) * size +
+                                stack*square_size + c for r in row_order for c in col_order])
+                            # rows of the first band keep their order, others are sorted later (-1)
+                            keys = [-1] * size
+                            for position, r in enumerate(row_order):
+                                keys[band*square_size + r] = position
+                            row_keys.append(keys)
+
+        self.num_candidates = len(orientations)
+        self.orientations = np.array(orientations, dtype=np.intp)
+        self.box_cells = np.array(box_cells, dtype=np.intp)
+        # cells of the first row of the box across the whole board
+        first_row_starts = self.box_cells[:, 0] - self.box_cells[:, 0] % size
+        self.first_row_cells = first_row_starts[:, np.newaxis] + np.arange(size)
+        self.row_keys = np.array(row_keys, dtype=np.int16)
+        self.labels = np.arange(1, size + 1, dtype=np.uint8)
+
+        # row cells packed per int64 words for lexicographic compare
+        self.cells_per_word = int(63 / math.log2(size + 1))
+        self.num_row_words = -(-size // self.cells_per_word)
+        self.word_powers = (size + 1) ** np.arange(self.cells_per_word - 1, -1, -1, dtype=np.int64)
+
+def _get_tables(square_size):
+    if square_size < 1 or square_size > MAX_SQUARE_SIZE:
+        raise ValueError("canonical form supports square size 1 to " + str(MAX_SQUARE_SIZE) +
+            ", got " + str(square_size))
+    tables = _tables.get(square_size)
+    if tables is None:
+        tables = _CanonTables(square_size)
+        _tables[square_size] = tables
+    return tables
+
+def _oriented(boards, size):
+    # (N, size*size) -> (N, 2*size*size): board, then its transpose
+    square = boards.reshape(-1, size, size)
+    return np.concatenate((square, square.transpose(0, 2, 1)), axis=1).reshape(len(boards), -1)
+
+def _pack_row(rows, tables):
+    # (P, size) -> (P, words) int64 keeping lexicographic order
+    if tables.num_row_words == 1:
+        return (rows.astype(np.int64) @ tables.word_powers[-rows.shape[1]:])[:, np.newaxis]
+    padded = np.zeros((len(rows), tables.num_row_words * tables.cells_per_word), dtype=np.int64)
+    padded[:, :rows.shape[1]] = rows
+    return padded.reshape(len(rows), tables.num_row_words, tables.cells_per_word) @ tables.word_powers
+
+def _keep_smallest(words, group_starts, group_sizes):
+    """
+        True for rows of words which are lexicographically smallest in their group.
+        groups are consecutive rows, given by starts and sizes
+    """
+    alive = np.ones(len(words), dtype=bool)
+    top = np.iinfo(np.int64).max
+    for w in range(words.shape[1]):
+        column = np.where(alive, words[:, w], top)
+        alive &= column == np.repeat(np.minimum.reduceat(column, group_starts), group_sizes)
+    return alive
+
+def _relabel(labels, values):
+    # labels (P, size+1) applied to digits (P, k)
+    offsets = np.arange(0, labels.size, labels.shape[1], dtype=np.intp)[:, np.newaxis]
+    return np.take(labels.reshape(-1), offsets + values)
+
+def _groups(board_index):
+    # starts and sizes of runs of equal values in sorted board_index
+    starts = np.flatnonzero(np.diff(board_index, prepend=-1))
+    return starts, np.diff(starts, append=len(board_index))
+
+def _canonize(oriented, oriented_masks, tables):
+    """
+        canonical grids (and smallest masks) for (N, 2*cells) oriented boards.
+        candidates are narrowed row by row, only ones tied on the smallest rows so far stay
+    """
+    size = tables.size
+    square_size = tables.square_size
+    num_boards = len(oriented)
+
+    # all candidates: labels from the first box, col order from the first row
+    box_values = oriented[:, tables.box_cells]
+    labels = np.zeros((num_boards, tables.num_candidates, size + 1), dtype=np.uint8)
+    np.put_along_axis(labels, box_values.astype(np.intp), np.broadcast_to(tables.labels, box_values.shape), axis=2)
+    first_row = _relabel(labels.reshape(-1, size + 1), oriented[:, tables.first_row_cells].reshape(-1, size))\
+        .reshape(num_boards, tables.num_candidates, size)
+
+    # stacks by their smallest label in the first row, inside a stack by the label
+    stack_min = first_row.reshape(num_boards, tables.num_candidates, square_size, square_size).min(axis=3)
+    col_keys = np.repeat(stack_min, square_size, axis=2).astype(np.int16) * (size + 1) + first_row
+    col_order = np.argsort(col_keys, axis=2)
+    rows = np.take_along_axis(first_row, col_order, axis=2)
+
+    group_starts = np.arange(num_boards) * tables.num_candidates
+    alive = _keep_smallest(_pack_row(rows.reshape(-1, size), tables), group_starts,
+        np.full(num_boards, tables.num_candidates))
+    board_index, candidates = np.divmod(np.flatnonzero(alive), tables.num_candidates)
+    labels = labels[board_index, candidates]
+    col_order = col_order[board_index, candidates]
+    orientations = tables.orientations[candidates]
+    row_keys = tables.row_keys[candidates]
+
+    # rows: first band as arranged, other bands by their smallest first col label, inside by the label
+    first_col_cells = orientations[:, np.newaxis] * tables.num_cells + np.arange(size) * size + col_order[:, :1]
+    first_col = _relabel(labels, oriented[board_index[:, np.newaxis], first_col_cells])
+    band_min = first_col.reshape(-1, square_size, square_size).min(axis=2)
+    sorted_keys = (np.repeat(band_min, square_size, axis=1).astype(np.int16) + 1) * (size + 1) + first_col
+    row_order = np.argsort(np.where(row_keys >= 0, row_keys, sorted_keys), axis=1)
+
+    def row_cells(row):
+        # board cells of output row of every alive candidate, in output col order
+        return orientations[:, np.newaxis] * tables.num_cells + row_order[:, row:row+1] * size + col_order
+
+    for row in range(1, size):
+        values = _relabel(labels, oriented[board_index[:, np.newaxis], row_cells(row)])
+        alive = _keep_smallest(_pack_row(values, tables), *_groups(board_index))
+        if alive.all():
+            continue
+        board_index, labels, col_order, row_order, orientations = \
+            board_index[alive], labels[alive], col_order[alive], row_order[alive], orientations[alive]
+
+    # candidates left give the same grid, they are automorphisms of it
+    cells = np.concatenate([row_cells(row) for row in range(size)], axis=1)
+    masks = None
+    if oriented_masks is not None:
+        mask_values = oriented_masks[board_index[:, np.newaxis], cells]
+        alive = np.ones(len(board_index), dtype=bool)
+        group_starts, group_sizes = _groups(board_index)
+        for row in range(size):
+            row_alive = _keep_smallest(np.where(alive[:, np.newaxis],
+                _pack_row(mask_values[:, row*size:(row+1)*size], tables), np.iinfo(np.int64).max),
+                group_starts, group_sizes)
+            alive &= row_alive
+        board_index, labels, cells, mask_values = board_index[alive], labels[alive], cells[alive], mask_values[alive]
+
+    # first of the candidates left for every board
+    _, first = np.unique(board_index, return_index=True)
+    grids = _relabel(labels[first], oriented[board_index[first, np.newaxis], cells[first]])
+    if oriented_masks is not None:
+        masks = mask_values[first].reshape(num_boards, size, size)
+    return grids.reshape(num_boards, size, size), masks
+
+def canonical_grids(grids, masks=None):
+    """
+        canonical forms of valid solved grids, (N, size, size) array-like.
+        with masks (1 for clues) the puzzles are canonized: returns (grids, masks) where
+        canonical puzzle is grids * masks. masks is None if not given
+    """
+    grids = np.asarray(grids, dtype=np.uint8)
+    if grids.ndim == 2:
+        grids = grids[np.newaxis]
+    num_boards, size = grids.shape[0], grids.shape[1]
+    tables = _get_tables(math.isqrt(size))
+    oriented = _oriented(grids.reshape(num_boards, -1), size)
+    oriented_masks = None
+    if masks is not None:
+        masks = np.asarray(masks, dtype=np.uint8).reshape(num_boards, -1)
+        oriented_masks = _oriented((masks != 0).astype(np.uint8), size)
+
+    # boards per block keep arrays of all candidates at tens of MB
+    block_boards = max(1, _block_elements // (tables.num_candidates * (size + 1)))
+    result_grids = np.empty((num_boards, size, size), dtype=np.uint8)
+    result_masks = np.empty((num_boards, size, size), dtype=np.uint8) if masks is not None else None
+    for start in range(0, num_boards, block_boards):
+        end = min(num_boards, start + block_boards)
+        block_grids, block_masks = _canonize(oriented[start:end],
+            oriented_masks[start:end] if masks is not None else None, tables)
+        result_grids[start:end] = block_grids
+        if masks is not None:
+            result_masks[start:end] = block_masks
+    return result_grids, result_masks
+
+def canonical_hashes(grids, masks=None):
+    """
+        HASH_SIZE-byte hashes of canonical forms as python ints, equal for grids
+        (or puzzles, with masks) which are the same under the symmetry group
+    """
+    canon_grids, canon_masks = canonical_grids(grids, masks)
+    if canon_masks is not None:
+        canon_grids = canon_grids * canon_masks
+    return [int.from_bytes(hashlib.blake2b(grid.tobytes(), digest_size=HASH_SIZE).digest(), 'little')
+        for grid in canon_grids]
+
+def canonical_form(board, clear_table=None):
+    """
+        canonical 2D board of solved board, or of the puzzle if clear_table is given
+    """
+    canon_grids, canon_masks = canonical_grids([board], [clear_table] if clear_table is not None else None)
+    canon = canon_grids[0] if canon_masks is None else canon_grids[0] * canon_masks[0]
+    return canon.tolist()
+
+def canonical_hash(board, clear_table=None):
+    return canonical_hashes([board], [clear_table] if clear_table is not None else None)[0]
+
+class PuzzleHashSet:
+    """
+        canonical hashes of already stored puzzles, kept in an append-only file
+        of little-endian uint64 values and in memory as a set.
+        add_new only keeps new hashes pending, commit writes them once their puzzles are stored
+    """
+    def __init__(self, path):
+        self.path = path
+        self.hashes = set()
+        self.pending = []# added hashes not in the file yet, in order of adding
+        self.num_repeats = 0# hashes add_new found already there
+        if os.path.exists(path):
+            self.hashes.update(np.fromfile(path, dtype='<u8').tolist())
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, puzzle_hash):
+        return puzzle_hash in self.hashes
+
+    def add_new(self, hashes):
+        """
+            add hashes which are not in the set yet, repeats inside hashes count once.
+            returns list of bools, True for every added hash
+        """
+        added = []
+        for puzzle_hash in hashes:
+            is_new = puzzle_hash not in self.hashes
+            if is_new:
+                self.hashes.add(puzzle_hash)
+                self.pending.append(puzzle_hash)
+            else:
+                self.num_repeats += 1
+            added.append(is_new)
+        return added
+
+    def commit(self, count=None):
+        """
+            write first count pending hashes (all if None) to the file, the rest are dropped
+            from the set, their puzzles were not stored
+        """
+        pending = self.pending
+        if count is None:
+            count = len(pending)
+        self.hashes.difference_update(pending[count:])
+        if count > 0:
+            with open(self.path, 'ab') as hash_file:
+                hash_file.write(np.array(pending[:count], dtype='<u8').tobytes())
+        self.pending = []
+
+def batches_of(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def hash_batches(batches, hash_batch, workers=1):
+    """
+        yield (batch, hash_batch(batch)) in order of batches. with workers > 1 batches are
+        hashed on a process pool, up to 2*workers of them ahead; hash_batch must be picklable.
+        workers None uses all cores
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for batch in batches:
+            yield batch, hash_batch(batch)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, executor.submit(hash_batch, batch)))
+            if len(pending) >= 2 * workers:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        for batch, future in pending:
+            yield batch, future.result()
+
+def dedupe_batches(items, hash_set, hash_batch, batch_size=256, workers=1):
+    """
+        yield items whose hash is not in hash_set yet, their hashes are added to it.
+        hash_batch(list of items) returns hashes of the items
+    """
+    for batch, hashes in hash_batches(batches_of(items, batch_size), hash_batch, workers):
+        for item, is_new in zip(batch, hash_set.add_new(hashes)):
+            if is_new:
+                yield item
+
+def _puzzle_hashes(puzzles):
+    return canonical_hashes([solved_board for solved_board, _ in puzzles], [clear_table for _, clear_table in puzzles])
+
+def dedupe_puzzles(puzzles, hash_set, batch_size=256, workers=1):
+    """
+        yield (solved_board, clear_table) pairs whose puzzle is not in hash_set yet,
+        new puzzles are added to hash_set
+    """
+    return dedupe_batches(puzzles, hash_set, _puzzle_hashes, batch_size, workers)
@@ -0,0 +1,132 @@
+"""
+    headless sudoku tool, one line per grid ('.' or '0' for empty cells):
+    81 chars for 9x9, 256 for 16x16 and 625 for 25x25 (digits above 9 are 'A'...'P')
+
+    python sudoku_cli.py generate -n 1000 --clues 28 > puzzles.txt
+    python sudoku_cli.py generate -n 1000 --dedupe seen.hashes >> puzzles.txt
+    python sudoku_cli.py grids -n 100000 > grids.txt
+    python sudoku_cli.py solve < puzzles.txt
+    python sudoku_cli.py validate < grids.txt
+    python sudoku_cli.py rate < puzzles.txt
+"""
+import argparse
+import sys
+
+from sudoku_utils import checkRowsCols, checkSquares, generate_stream, board_from_line, board_to_line,\
+    apply_clear_table, generate_grids
+from sudoku_solver import solve_board, count_solutions
+from sudoku_rating import rate_board
+from sudoku_canon import PuzzleHashSet, dedupe_puzzles, MAX_SQUARE_SIZE
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return value
+
+def command_generate(args, out):
+    hash_set = PuzzleHashSet(args.dedupe) if args.dedupe else None
+    num_left = args.n
+    while num_left > 0:
+        pairs = generate_stream(num_left, args.workers, args.clues, args.square_size)
+        if hash_set is not None:
+            pairs = dedupe_puzzles(pairs, hash_set, workers=args.workers)
+        num_written = 0
+        for solved_board, clear_table in pairs:
+            line = board_to_line(apply_clear_table(solved_board, clear_table))
+            if args.with_solution:
+                line += ' ' + board_to_line(solved_board)
+            out.write(line + '\n')
+            num_written += 1
+        if hash_set is not None:
+            hash_set.commit()# hashes of written puzzles only
+        num_left -= num_written
+        if num_written == 0:
+            # small boards can run out of new puzzles
+            sys.stderr.write("no new puzzles, " + str(num_left) + " not written\n")
+            break
+
+def command_grids(args, out):
+    for grid in generate_grids(args.n, args.square_size, args.transforms_per_fill):
+        out.write(board_to_line(grid) + '\n')
+
+def command_solve(args, lines, out):
+    # one output line per input line: solution or 'none'
+    for line in lines:
+        board = board_from_line(line)
+        solved_board = solve_board(board) if board is not None else None
+        out.write((board_to_line(solved_board) if solved_board is not None else 'none') + '\n')
+
+def command_validate(args, lines, out):
+    """
+        full grids: valid / invalid
+        puzzles with empty cells: unique / multiple / invalid
+    """
+    for line in lines:
+        board = board_from_line(line)
+        if board is None:
+            result = 'invalid'
+        elif all(val != 0 for row in board for val in row):
+            result = 'valid' if checkRowsCols(board) and checkSquares(board) else 'invalid'
+        else:
+            result = ('invalid', 'unique', 'multiple')[count_solutions(board, limit=2)]
+        out.write(result + '\n')
+
+def command_rate(args, lines, out):
+    # one output line per input line: difficulty, hardest technique, steps and clue count
+    for line in lines:
+        board = board_from_line(line)
+        rating = rate_board(board) if board is not None else None
+        if rating is None:
+            out.write('invalid\n')
+        else:
+            num_clues = sum(1 for row in board for val in row if val != 0)
+            out.write(' '.join([rating.difficulty, rating.technique, str(rating.steps), str(num_clues)]) + '\n')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="headless sudoku generate/solve/validate/rate")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help="write unique-solution puzzles")
+    generate_parser.add_argument('-n', type=int, default=1, help="number of puzzles")
+    generate_parser.add_argument('--clues', type=int, default=30, help="target clue count")
+    generate_parser.add_argument('--square-size', type=int, default=3, choices=[2,3,4,5],
+                                    help="box side, 3 for 9x9 board, 4 for 16x16, 5 for 25x25")
+    generate_parser.add_argument('--workers', type=int, default=None, help="processes, default all cores")
+    generate_parser.add_argument('--with-solution', action='store_true',
+                                    help="append solution to every line after a space")
+    generate_parser.add_argument('--dedupe', default=None, metavar='PATH',
+                                    help="skip puzzles equivalent to ones whose hashes are in PATH, add new ones")
+
+    grids_parser = subparsers.add_parser('grids', help="write solved grids")
+    grids_parser.add_argument('-n', type=int, default=1, help="number of grids")
+    grids_parser.add_argument('--square-size', type=int, default=3, choices=[2,3,4,5])
+    grids_parser.add_argument('--transforms-per-fill', type=positive_int, default=64,
+                                    help="grids made from one backtracking fill by random symmetries, "
+                                        "they are one grid up to symmetry; 1 makes every grid a fresh fill")
+
+    subparsers.add_parser('solve', help="solve puzzles from stdin")
+    subparsers.add_parser('validate', help="check grids or puzzle uniqueness from stdin")
+    subparsers.add_parser('rate', help="rate puzzles from stdin")
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate' and args.dedupe and args.square_size > MAX_SQUARE_SIZE:
+        parser.error("--dedupe supports square size up to " + str(MAX_SQUARE_SIZE))
+    out = sys.stdout
+    try:
+        if args.command == 'generate':
+            command_generate(args, out)
+        elif args.command == 'grids':
+            command_grids(args, out)
+        else:
+            lines = (line for line in sys.stdin if line.strip())
+            {'solve': command_solve, 'validate': command_validate, 'rate': command_rate}[args.command](args, lines, out)
+        out.flush()
+    except BrokenPipeError:
+        # reader closed the pipe (e.g. head), stop quietly
+        sys.stderr.close()
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
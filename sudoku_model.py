@@ -0,0 +1,439 @@
+import math
+import struct
+import sys
+from array import array
+from sudoku_utils import *
+from sudoku_solver import solve_board, count_solutions, get_context
+from sudoku_rating import next_deduction, Deduction, SEARCH_LEVEL
+from dataclasses import dataclass
+from enum import Enum
+
+class CellType(Enum):
+    CHANGEABLE = 0
+    NON_CHANGEABLE = 1
+    HINTED = 2
+    CHECKED_WRONG = 3
+
+@dataclass
+class BoardCell:
+    value: int
+    cell_type: CellType
+
+# CellType by its stored value
+_cell_types = tuple(CellType)
+
+# session file: header, solved values, board values, cell types, move log
+SESSION_MAGIC = b'SDKS'
+SESSION_VERSION = 1
+_session_header = struct.Struct('<4sBBBxII')# magic, version, square_size, flags, log moves, moves applied
+SESSION_HIGHLIGHT = 1# flag: wrong values are highlighted
+# move log entry: cell index, old value, new value, old cell type << 4 | new cell type
+MOVE_FIELDS = 4
+
+class BoardCellView:
+    """
+        BoardCell-like access to one cell of CompactBoard
+    """
+    __slots__ = ('board', 'index')
+
+    def __init__(self, board, index):
+        self.board = board
+        self.index = index
+
+    @property
+    def value(self):
+        return self.board.values[self.index]
+
+    @value.setter
+    def value(self, value):
+        self.board.set_value_at(self.index, value)
+
+    @property
+    def cell_type(self):
+        return _cell_types[self.board.cell_types[self.index]]
+
+    @cell_type.setter
+    def cell_type(self, cell_type):
+        self.board.set_cell_type_at(self.index, cell_type)
+
+class BoardRowView:
+    __slots__ = ('board', 'y')
+
+    def __init__(self, board, y):
+        self.board = board
+        self.y = y
+
+    def __len__(self):
+        return self.board.size
+
+    def __getitem__(self, x):
+        return BoardCellView(self.board, self.y*self.board.size + x)
+
+    def __iter__(self):
+        for x in range(self.board.size):
+            yield self[x]
+
+class CompactBoard:
+    """
+        size*size board kept in two bytearrays: cell values (0 is empty) and CellType values.
+        board[y][x] gives BoardCell-like view for code written for nested lists of BoardCell.
+        snapshot() shares buffers, they are copied on the first write to either board
+    """
+    __slots__ = ('size', 'values', 'cell_types', '_shared')
+
+    def __init__(self, size, values=None, cell_types=None):
+        self.size = size
+        self.values = bytearray(values) if values is not None else bytearray(size*size)
+        self.cell_types = bytearray(cell_types) if cell_types is not None else bytearray(size*size)
+        self._shared = False
+
+    def get_value(self, y, x):
+        return self.values[y*self.size + x]
+
+    def get_cell_type(self, y, x):
+        return _cell_types[self.cell_types[y*self.size + x]]
+
+    def _own_buffers(self):
+        if self._shared:
+            self.values = bytearray(self.values)
+            self.cell_types = bytearray(self.cell_types)
+            self._shared = False
+
+    def set_value_at(self, index, value):
+        if self._shared:
+            self._own_buffers()
+        self.values[index] = value
+
+    def set_cell_type_at(self, index, cell_type: CellType):
+        if self._shared:
+            self._own_buffers()
+        self.cell_types[index] = cell_type.value
+
+    def snapshot(self):
+        snapshot = CompactBoard.__new__(CompactBoard)
+        snapshot.size = self.size
+        snapshot.values = self.values
+        snapshot.cell_types = self.cell_types
+        snapshot._shared = True
+        self._shared = True
+        return snapshot
+
+    def to_lists(self):
+        return [list(self.values[self.size*n:self.size*n+self.size]) for n in range(self.size)]# 1D -> 2D
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, y):
+        return BoardRowView(self, y)
+
+    def __iter__(self):
+        for y in range(self.size):
+            yield self[y]
+
+class SudokuLogic():
+    default_target_clues = 73# for 9x9 board, same amount as former percent_clear=10
+
+    __slots__ = ('size', 'square_size', 'num_cells', 'game_board', 'solved_values', 'counts',
+        'num_filled', 'num_conflicts', 'highlight_incorrect', 'changed_cells', 'move_log', 'num_moves',
+        'context', 'candidates', 'num_wrong')
+
+    def __init__(self, puzzle=None, target_clues=None, square_size=3, solution=None):
+        if puzzle is None:
+            solved_board = random_solved_board(square_size)
+
+            if False == checkRowsCols(solved_board) or False == checkSquares(solved_board):
+                raise Exception("board generation failed")
+            if target_clues is None:
+                target_clues = SudokuLogic.get_default_target_clues(square_size)
+            clear_table = get_unique_clear_table(solved_board, target_clues)# erase some numbers
+        elif solution is not None:
+            # trusted puzzle with known solution, e.g. from puzzle bank
+            solved_board = solution
+            clear_table = [[0 if el is None or el == 0 else 1 for el in row] for row in puzzle]
+        else:
+            # puzzle from outside: 0 or None for empty cells
+            if count_solutions(puzzle, limit=2) != 1:
+                raise Exception("puzzle has no unique solution")
+            solved_board = solve_board(puzzle)
+            clear_table = [[0 if el is None or el == 0 else 1 for el in row] for row in puzzle]
+
+        solved_values = bytes(el for row in solved_board for el in row)
+        clear_values = [el for row in clear_table for el in row]
+        self._init_board(len(solved_board), solved_values, CompactBoard(len(solved_board),
+            [el_b*el_c for el_b,el_c in zip(solved_values, clear_values)],
+            [CellType.CHANGEABLE.value if el_c == 0 else CellType.NON_CHANGEABLE.value for el_c in clear_values]))
+
+    def _init_board(self, size, solved_values, game_board):
+        self.size = size
+        self.square_size = math.isqrt(self.size)
+        self.num_cells = self.size * self.size
+        self.solved_values = solved_values
+        self.game_board = game_board
+        self.context = get_context(self.square_size)
+
+        # digit counters of rows, then cols, then boxes; size+1 per unit, index 0 is unused (empty cell)
+        self.counts = bytearray(3 * self.size * (self.size+1))
+        self.num_filled = 0
+        self.num_conflicts = 0# extra repeats of digits in rows, cols and boxes
+
+        self.highlight_incorrect = False
+        self.changed_cells = []# cell indexes to recheck in update_correct_values
+
+        # MOVE_FIELDS numbers per move; moves after num_moves are undone ones, kept for redo
+        self.move_log = array('H')
+        self.num_moves = 0
+
+        # pencil marks: bit d-1 set if digit d is not in row, col or box of the cell.
+        # filled cells keep marks too, they are valid again when the cell is cleared.
+        # 16 bits are enough up to 16x16, 25x25 needs 32
+        self.candidates = array('H' if self.size <= 16 else 'I', [self.context.full_mask]) * self.num_cells
+        self.num_wrong = 0# filled cells which differ from solution
+
+        for i, value in enumerate(self.game_board.values):
+            if value != 0:
+                self._add_digit(i, value)
+                if value != self.solved_values[i]:
+                    self.num_wrong += 1
+
+    @staticmethod
+    def get_default_target_clues(square_size):
+        # same share of clues for bigger boards
+        return SudokuLogic.default_target_clues * square_size**4 // 81
+
+    @property
+    def solved_board(self):
+        return [list(self.solved_values[self.size*n:self.size*n+self.size]) for n in range(self.size)]# 1D -> 2D
+
+    def _count_indexes(self, i, value):
+        y, x = divmod(i, self.size)
+        box = (y//self.square_size)*self.square_size + x//self.square_size
+        unit_len = self.size + 1
+        return (y*unit_len + value, (self.size + x)*unit_len + value, (2*self.size + box)*unit_len + value)
+
+    def _add_digit(self, i, value):
+        counts = self.counts
+        for index in self._count_indexes(i, value):
+            if counts[index] > 0:
+                self.num_conflicts += 1
+            counts[index] += 1
+        self.num_filled += 1
+
+        candidates = self.candidates
+        keep = ~(1 << (value - 1))
+        for p in self.context.peers[i]:
+            candidates[p] &= keep
+
+    def _remove_digit(self, i, value):
+        counts = self.counts
+        for index in self._count_indexes(i, value):
+            counts[index] -= 1
+            if counts[index] > 0:
+                self.num_conflicts -= 1
+        self.num_filled -= 1
+
+        # digit is a candidate of the cell and its peers again if no other cell of their units has it
+        candidates = self.candidates
+        bit = 1 << (value - 1)
+        unit_len = self.size + 1
+        cell_units = self.context.cell_units
+        for p in self.context.peers[i] + [i]:
+            row, col, box = cell_units[p]
+            if not (counts[row*unit_len + value] or counts[col*unit_len + value] or counts[box*unit_len + value]):
+                candidates[p] |= bit
+
+    def _set_value(self, i, value):
+        old_value = self.game_board.values[i]
+        if old_value == value:
+            return
+        if old_value != 0:
+            self._remove_digit(i, old_value)
+            if old_value != self.solved_values[i]:
+                self.num_wrong -= 1
+        if value != 0:
+            self._add_digit(i, value)
+            if value != self.solved_values[i]:
+                self.num_wrong += 1
+        self.game_board.set_value_at(i, value)
+        self.changed_cells.append(i)
+
+    def _log_move(self, i, old_value, new_value, old_type, new_type):
+        log = self.move_log
+        end = self.num_moves * MOVE_FIELDS
+        if len(log) > end:
+            # new move drops undone moves
+            del log[end:]
+        log.extend((i, old_value, new_value, old_type << 4 | new_type))
+        self.num_moves += 1
+
+    def update_cell(self, grid_pos_y,grid_pos_x, cell_value):
+        i = grid_pos_y*self.size + grid_pos_x
+        cell_type = _cell_types[self.game_board.cell_types[i]]
+        if cell_type == CellType.CHANGEABLE or cell_type == CellType.CHECKED_WRONG:
+            old_value = self.game_board.values[i]
+            if old_value != cell_value:
+                self._log_move(i, old_value, cell_value, cell_type.value, cell_type.value)
+                self._set_value(i, cell_value)
+
+    def get_candidates(self, grid_pos_y, grid_pos_x):
+        # pencil marks bitmask of the cell, 0 if it is filled
+        i = grid_pos_y*self.size + grid_pos_x
+        return self.candidates[i] if self.game_board.values[i] == 0 else 0
+
+    def find_hint(self):
+        """
+            next cell to fill as Deduction: the first one the easiest working techniques reach,
+            wrong values are ignored on the way and can be the hinted cell.
+            if techniques are not enough, first cell which differs from solution with 'search'.
+            None if board is solved
+        """
+        board_values = self.game_board.values
+        if self.num_wrong == 0:
+            # pencil marks are exactly the candidates of correct values
+            values = list(board_values)
+            deduction = next_deduction(values, None, None, None, self.context,
+                [cand if not value else 0 for cand, value in zip(self.candidates, values)])
+        else:
+            values = [value if value == solved_value else 0 for value, solved_value in zip(board_values, self.solved_values)]
+            masks = [0] * (3*self.size)
+            for i, value in enumerate(values):
+                if value:
+                    for unit_id in self.context.cell_units[i]:
+                        masks[unit_id] |= 1 << (value - 1)
+            size = self.size
+            deduction = next_deduction(values, masks[:size], masks[size:2*size], masks[2*size:], self.context)
+        if deduction is not None:
+            return deduction
+
+        for i in range(self.num_cells):
+            if board_values[i] != self.solved_values[i]:
+                return Deduction(i, self.solved_values[i], 'search', SEARCH_LEVEL)
+        return None
+
+    def add_hint_value(self):
+        """
+            fill cell of find_hint with solution value, returns the Deduction or None
+        """
+        hint = self.find_hint()
+        if hint is None:
+            return None
+        i = hint.cell
+        self._log_move(i, self.game_board.values[i], self.solved_values[i], self.game_board.cell_types[i], CellType.HINTED.value)
+        self._set_value(i, self.solved_values[i])
+        self.game_board.set_cell_type_at(i, CellType.HINTED)
+        return hint
+
+    def _apply_move(self, i, value, cell_type):
+        # _set_value marks the cell changed, update_correct_values fixes stale CHECKED_WRONG type
+        self._set_value(i, value)
+        self.game_board.set_cell_type_at(i, _cell_types[cell_type])
+
+    def undo(self):
+        """
+            revert last move, returns its cell index or None if there is nothing to undo
+        """
+        if self.num_moves == 0:
+            return None
+        self.num_moves -= 1
+        offset = self.num_moves * MOVE_FIELDS
+        i, old_value, _, types = self.move_log[offset:offset + MOVE_FIELDS]
+        self._apply_move(i, old_value, types >> 4)
+        return i
+
+    def redo(self):
+        """
+            apply last undone move again, returns its cell index or None if there is nothing to redo
+        """
+        offset = self.num_moves * MOVE_FIELDS
+        if offset >= len(self.move_log):
+            return None
+        i, _, new_value, types = self.move_log[offset:offset + MOVE_FIELDS]
+        self.num_moves += 1
+        self._apply_move(i, new_value, types & 0xF)
+        return i
+
+    def snapshot(self):
+        # board state sharing buffers with the game, copied only when one of them changes
+        return self.game_board.snapshot()
+
+    def to_session_bytes(self):
+        log = self.move_log
+        if sys.byteorder == 'big':
+            log = array('H', log)
+            log.byteswap()
+        flags = SESSION_HIGHLIGHT if self.highlight_incorrect else 0
+        return b''.join((_session_header.pack(SESSION_MAGIC, SESSION_VERSION, self.square_size, flags,
+            len(self.move_log) // MOVE_FIELDS, self.num_moves), self.solved_values,
+            self.game_board.values, self.game_board.cell_types, log.tobytes()))
+
+    @staticmethod
+    def from_session_bytes(data):
+        magic, version, square_size, flags, log_moves, num_moves = _session_header.unpack_from(data, 0)
+        if magic != SESSION_MAGIC or version != SESSION_VERSION:
+            raise Exception("not a sudoku session")
+        size = square_size * square_size
+        num_cells = size * size
+        offset = _session_header.size
+        if len(data) != offset + 3*num_cells + log_moves * MOVE_FIELDS * 2 or num_moves > log_moves:
+            raise Exception("broken sudoku session")
+
+        solved_values = bytes(data[offset:offset + num_cells])
+        offset += num_cells
+        game_board = CompactBoard(size, data[offset:offset + num_cells], data[offset + num_cells:offset + 2*num_cells])
+        offset += 2*num_cells
+
+        model = SudokuLogic.__new__(SudokuLogic)
+        model._init_board(size, solved_values, game_board)
+        model.move_log.frombytes(data[offset:])
+        if sys.byteorder == 'big':
+            model.move_log.byteswap()
+        model.num_moves = num_moves
+        model.highlight_incorrect = bool(flags & SESSION_HIGHLIGHT)
+        return model
+
+    def save_session(self, path):
+        with open(path, 'wb') as session_file:
+            session_file.write(self.to_session_bytes())
+
+    @staticmethod
+    def load_session(path):
+        with open(path, 'rb') as session_file:
+            return SudokuLogic.from_session_bytes(session_file.read())
+
+    def _update_correct_value(self, i):
+        board = self.game_board
+        cell_type = _cell_types[board.cell_types[i]]
+        if cell_type == CellType.CHANGEABLE or cell_type == CellType.CHECKED_WRONG:
+            if self.highlight_incorrect:
+                value = board.values[i]
+                if value != 0:
+                    if value != self.solved_values[i]:
+                        new_type = CellType.CHECKED_WRONG
+                    else:
+                        new_type = CellType.CHANGEABLE
+                else:
+                    new_type = cell_type
+            else:
+                new_type = CellType.CHANGEABLE
+            if new_type != cell_type:
+                board.set_cell_type_at(i, new_type)
+
+    def update_correct_values(self, highlight_incorrect):
+        """
+            recheck only cells changed since last call, whole board only when highlight is toggled
+        """
+        if highlight_incorrect != self.highlight_incorrect:
+            self.highlight_incorrect = highlight_incorrect
+            self.changed_cells.clear()
+            for i in range(self.num_cells):
+                self._update_correct_value(i)
+            return
+
+        if not self.changed_cells:
+            return
+        for i in self.changed_cells:
+            self._update_correct_value(i)
+        self.changed_cells.clear()
+
+    def is_puzzle_solved(self):
+        return self.num_filled == self.num_cells and self.num_conflicts == 0
@@ -0,0 +1,80 @@
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+from dataclasses import dataclass
+
+from sudoku_utils import generate_puzzle, apply_clear_table
+from sudoku_model import SudokuLogic
+
+@dataclass
+class PrefetchStats:
+    restarts: int = 0
+    waited_restarts: int = 0# restarts which found no ready game
+    total_wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    last_depth: int = 0# ready games when last restart happened
+    failures: int = 0# takes which raised, generation error or broken pool
+
+def _generate_game_task(target_clues, square_size):
+    return generate_puzzle(target_clues, square_size)
+
+class SudokuPrefetcher:
+    """
+        keeps up to depth games generated on a background process pool,
+        take() hands out a ready one and orders the next.
+        if a worker fails take() raises, a broken pool is started again first
+    """
+    def __init__(self, depth=2, target_clues=None, square_size=3, workers=1):
+        self.depth = depth
+        self.square_size = square_size
+        self.target_clues = target_clues if target_clues is not None else\
+            SudokuLogic.get_default_target_clues(square_size)
+        self.workers = workers
+        self.stats = PrefetchStats()
+        self._start_pool()
+
+    def _start_pool(self):
+        # spawn, workers must not inherit SDL state of the game process
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self.pending = deque()
+        for _ in range(self.depth):
+            self._order()
+
+    def _order(self):
+        self.pending.append(self.executor.submit(_generate_game_task, self.target_clues, self.square_size))
+
+    def ready_count(self):
+        return sum(1 for future in self.pending if future.done())
+
+    def take(self):
+        """
+            returns (SudokuLogic, wait time in seconds); wait time is 0 if a game was ready
+        """
+        self.stats.restarts += 1
+        self.stats.last_depth = self.ready_count()
+
+        future = self.pending.popleft()
+        wait_time = 0.0
+        try:
+            self._order()
+            if not future.done():
+                start = time.perf_counter()
+                future.exception()
+                wait_time = time.perf_counter() - start
+                self.stats.waited_restarts += 1
+                self.stats.total_wait_time += wait_time
+                self.stats.max_wait_time = max(self.stats.max_wait_time, wait_time)
+            solved_board, clear_table = future.result()
+        except BrokenExecutor:
+            self.stats.failures += 1
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self._start_pool()
+            raise
+        except Exception:
+            self.stats.failures += 1
+            raise
+        return SudokuLogic(apply_clear_table(solved_board, clear_table), solution=solved_board), wait_time
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
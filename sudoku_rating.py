@@ -0,0 +1,328 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import combinations
+
+from sudoku_solver import get_context, square_size_of, load_board, count_solutions
+
+# human techniques from easiest to hardest, level of a technique is its index
+TECHNIQUES = ('naked_single', 'hidden_single', 'locked_candidates', 'naked_pair', 'hidden_pair',
+    'naked_triple', 'hidden_triple', 'x_wing', 'swordfish')
+# level used when techniques are not enough and guessing is needed
+SEARCH_LEVEL = len(TECHNIQUES)
+DIFFICULTIES = ('easy', 'easy', 'medium', 'medium', 'medium', 'hard', 'hard', 'expert', 'expert', 'extreme')
+
+@dataclass
+class Rating:
+    technique: str# hardest technique needed, 'search' if techniques are not enough
+    level: int
+    steps: int# placements and eliminations applied
+    solved: bool
+
+    @property
+    def difficulty(self):
+        return DIFFICULTIES[self.level]
+
+@dataclass
+class Deduction:
+    cell: int# index in flattened board
+    value: int
+    technique: str# hardest technique needed to reach it, 'search' if techniques are not enough
+    level: int
+
+class _Contradiction(Exception):
+    pass
+
+class CandidateGrid:
+    """
+        pencil marks of a board, kept up to date on every placement and elimination
+        instead of being recomputed. cands, if given, are taken instead of computing
+        them from rows/cols/boxes masks, 0 for filled cells
+    """
+    def __init__(self, values, rows, cols, boxes, context, cands=None):
+        self.context = context
+        self.values = values
+        if cands is not None:
+            self.cands = list(cands)
+            if any(not cand and not value for cand, value in zip(self.cands, values)):
+                raise _Contradiction()
+        else:
+            self.cands = [0] * context.num_cells
+            for i in range(context.num_cells):
+                if not values[i]:
+                    cand = context.full_mask & ~(rows[context.cell_row[i]] | cols[context.cell_col[i]] |
+                        boxes[context.cell_box[i]])
+                    if cand == 0:
+                        raise _Contradiction()
+                    self.cands[i] = cand
+        self.num_empty = sum(1 for value in values if not value)
+        # cells which may be naked singles and units which may hold hidden singles
+        self.single_cells = [i for i in range(context.num_cells) if self.cands[i] and
+            self.cands[i] & (self.cands[i] - 1) == 0]
+        self.dirty_units = set(range(len(context.units)))
+        self.last_placed = -1
+
+    def place(self, i, bit):
+        context = self.context
+        self.values[i] = context.bit_digit[bit]
+        self.last_placed = i
+        self.cands[i] = 0
+        self.num_empty -= 1
+        for p in context.peers[i]:
+            if self.cands[p] & bit:
+                self._remove(p, bit)
+        self.dirty_units.update(context.cell_units[i])
+
+    def eliminate(self, i, bits):
+        """
+            remove bits from candidates of cell i, returns True if something was removed
+        """
+        if not self.cands[i] & bits:
+            return False
+        self._remove(i, bits)
+        return True
+
+    def _remove(self, i, bits):
+        cand = self.cands[i] & ~bits
+        if cand == 0:
+            raise _Contradiction()
+        self.cands[i] = cand
+        if cand & (cand - 1) == 0:
+            self.single_cells.append(i)
+        for unit_id in self.context.cell_units[i]:
+            self.dirty_units.add(unit_id)
+
+    def cells_with(self, cells, bit):
+        return [i for i in cells if self.cands[i] & bit]
+
+def _naked_single(grid):
+    while grid.single_cells:
+        i = grid.single_cells.pop()
+        cand = grid.cands[i]
+        if cand and cand & (cand - 1) == 0:
+            grid.place(i, cand)
+            return True
+    return False
+
+def _hidden_single(grid):
+    units = grid.context.units
+    cands = grid.cands
+    while grid.dirty_units:
+        unit_id = next(iter(grid.dirty_units))
+        cells = units[unit_id][2]
+        once = 0
+        twice = 0
+        for i in cells:
+            cand = cands[i]
+            twice |= once & cand
+            once |= cand
+        hidden = once & ~twice
+        if hidden:
+            bit = hidden & -hidden
+            for i in cells:
+                if cands[i] & bit:
+                    # unit stays dirty, it may hold more hidden singles
+                    grid.place(i, bit)
+                    return True
+        grid.dirty_units.discard(unit_id)
+    return False
+
+def _locked_candidates(grid):
+    """
+        pointing: digit of a box only in one row/col of it, removed from rest of the row/col.
+        claiming: digit of a row/col only in one box, removed from rest of the box
+    """
+    context = grid.context
+    size = context.size
+    units = context.units
+    progress = False
+    for unit_id, (kind, index, cells) in enumerate(units):
+        digits = 0
+        for i in cells:
+            digits |= grid.cands[i]
+        while digits:
+            bit = digits & -digits
+            digits ^= bit
+            places = grid.cells_with(cells, bit)
+            if len(places) < 2:
+                continue
+            if kind == 2:
+                # box -> row or col
+                targets = []
+                if all(context.cell_row[i] == context.cell_row[places[0]] for i in places):
+                    targets.append(context.cell_row[places[0]])
+                if all(context.cell_col[i] == context.cell_col[places[0]] for i in places):
+                    targets.append(size + context.cell_col[places[0]])
+            else:
+                # row or col -> box
+                box = context.cell_box[places[0]]
+                targets = [2*size + box] if all(context.cell_box[i] == box for i in places) else []
+            for target in targets:
+                for i in units[target][2]:
+                    if i not in places and grid.eliminate(i, bit):
+                        progress = True
+            if progress:
+                return True
+    return False
+
+def _naked_subset(grid, n):
+    for kind, index, cells in grid.context.units:
+        open_cells = [i for i in cells if grid.cands[i] and bin(grid.cands[i]).count("1") <= n]
+        if len(open_cells) < n:
+            continue
+        for subset in combinations(open_cells, n):
+            union = 0
+            for i in subset:
+                union |= grid.cands[i]
+            if bin(union).count("1") != n:
+                continue
+            progress = False
+            for i in cells:
+                if i not in subset and grid.eliminate(i, union):
+                    progress = True
+            if progress:
+                return True
+    return False
+
+def _hidden_subset(grid, n):
+    for kind, index, cells in grid.context.units:
+        places = {}
+        digits = 0
+        for i in cells:
+            digits |= grid.cands[i]
+        while digits:
+            bit = digits & -digits
+            digits ^= bit
+            digit_places = grid.cells_with(cells, bit)
+            if 2 <= len(digit_places) <= n:
+                places[bit] = digit_places
+        if len(places) < n:
+            continue
+        for subset in combinations(places, n):
+            cells_union = set()
+            for bit in subset:
+                cells_union.update(places[bit])
+            if len(cells_union) != n:
+                continue
+            keep = 0
+            for bit in subset:
+                keep |= bit
+            progress = False
+            for i in cells_union:
+                if grid.eliminate(i, ~keep & grid.context.full_mask):
+                    progress = True
+            if progress:
+                return True
+    return False
+
+def _fish(grid, n):
+    """
+        x-wing (n=2), swordfish (n=3): digit in n rows limited to n cols is removed
+        from other cells of those cols, same with rows and cols exchanged
+    """
+    context = grid.context
+    size = context.size
+    for bit in context.bit_digit:
+        for base_kind in (0, 1):
+            lines = {}
+            for index in range(size):
+                cells = context.units[base_kind*size + index][2]
+                positions = [context.cell_col[i] if base_kind == 0 else context.cell_row[i]
+                    for i in grid.cells_with(cells, bit)]
+                if 2 <= len(positions) <= n:
+                    lines[index] = positions
+            if len(lines) < n:
+                continue
+            for subset in combinations(lines, n):
+                cover = set()
+                for index in subset:
+                    cover.update(lines[index])
+                if len(cover) != n:
+                    continue
+                progress = False
+                cover_kind = 1 - base_kind
+                for cover_index in cover:
+                    for i in context.units[cover_kind*size + cover_index][2]:
+                        line = context.cell_row[i] if base_kind == 0 else context.cell_col[i]
+                        if line not in subset and grid.eliminate(i, bit):
+                            progress = True
+                if progress:
+                    return True
+    return False
+
+_technique_steps = (
+    _naked_single,
+    _hidden_single,
+    _locked_candidates,
+    lambda grid: _naked_subset(grid, 2),
+    lambda grid: _hidden_subset(grid, 2),
+    lambda grid: _naked_subset(grid, 3),
+    lambda grid: _hidden_subset(grid, 3),
+    lambda grid: _fish(grid, 2),
+    lambda grid: _fish(grid, 3),
+)
+
+def rate_board(board):
+    """
+        solve board with human techniques only, always using the easiest one that works.
+        returns Rating or None if board has conflicting givens or no solution
+    """
+    context = get_context(square_size_of(board))
+    loaded = load_board(board, context)
+    if loaded is None:
+        return None
+    try:
+        grid = CandidateGrid(*loaded, context)
+        level = 0
+        steps = 0
+        while grid.num_empty:
+            for technique_level, technique_step in enumerate(_technique_steps):
+                if technique_step(grid):
+                    level = max(level, technique_level)
+                    steps += 1
+                    break
+            else:
+                # no technique works, solving needs search
+                if count_solutions(board, limit=1) == 0:
+                    return None
+                return Rating('search', SEARCH_LEVEL, steps, False)
+    except _Contradiction:
+        return None
+    return Rating(TECHNIQUES[level], level, steps, True)
+
+def next_deduction(values, rows, cols, boxes, context, cands=None):
+    """
+        first cell the easiest working techniques fill on flattened board, values are not changed.
+        returns Deduction or None if techniques are not enough or board has a contradiction
+    """
+    try:
+        grid = CandidateGrid(values[:], rows, cols, boxes, context, cands)
+        level = 0
+        while grid.num_empty:
+            num_empty = grid.num_empty
+            for technique_level, technique_step in enumerate(_technique_steps):
+                if technique_step(grid):
+                    level = max(level, technique_level)
+                    break
+            else:
+                return None
+            if grid.num_empty < num_empty:
+                # eliminations of harder techniques on the way count for the placement
+                i = grid.last_placed
+                return Deduction(i, grid.values[i], TECHNIQUES[level], level)
+    except _Contradiction:
+        return None
+    return None
+
+def rate_batch(boards, workers=None):
+    """
+        rate list of boards on a process pool, workers=None uses all cores
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return [rate_board(board) for board in boards]
+
+    chunksize = max(1, len(boards) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(rate_board, boards, chunksize=chunksize))
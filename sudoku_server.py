@@ -0,0 +1,278 @@
+"""
+    asyncio server hosting many headless SudokuLogic sessions over a JSON-lines protocol,
+    TCP or unix socket. one JSON object per line each way, responses come in request order
+    and echo 'id' of the request:
+
+    {"id": 1, "op": "new", "clues": 30, "square_size": 3}
+        -> {"id": 1, "ok": true, "session": "9f2c...", "square_size": 3, "board": "..3.1..."}
+    {"op": "move", "session": "9f2c...", "row": 0, "col": 2, "value": 4}   value 0 clears the cell
+        -> {"ok": true, "solved": false}
+    {"op": "hint", "session": ...}    -> {"ok": true, "row": 4, "col": 7, "value": 2, "technique": "naked_single"}
+    {"op": "check", "session": ...}   -> {"ok": true, "wrong": [[0, 2]]}
+    {"op": "solved", "session": ...}  -> {"ok": true, "solved": false, "filled": 52}
+    {"op": "close", "session": ...}   -> {"ok": true}
+    {"op": "stats"}                   -> {"ok": true, "sessions": 120, "evicted": 3, ...}
+    errors: {"id": 1, "ok": false, "error": "unknown session"}
+
+    puzzles are generated on a process pool, at most max_pending_new at once; a connection
+    reads its next request only after the previous response is written out, so slow readers
+    and busy generation push back on clients instead of growing queues.
+    sessions idle for idle_timeout seconds are dropped.
+
+    python sudoku_server.py --port 8765
+    python sudoku_server.py --unix /tmp/sudoku.sock --workers 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from sudoku_utils import generate_puzzle, apply_clear_table, board_to_line
+from sudoku_model import SudokuLogic
+
+MAX_LINE = 64 * 1024# longer request lines close the connection
+
+class GameSession:
+    __slots__ = ('model', 'last_used')
+
+    def __init__(self, model):
+        self.model = model
+        self.last_used = time.monotonic()
+
+def _int_field(request, name, low, high, default=None):
+    value = request.get(name, default)
+    if type(value) is not int or value < low or value > high:
+        raise Exception(name + " must be integer from " + str(low) + " to " + str(high))
+    return value
+
+class SudokuServer:
+    """
+        sessions are kept in access order, so eviction only looks at the oldest ones
+    """
+    def __init__(self, workers=1, max_sessions=10000, max_pending_new=None, idle_timeout=600.0,
+                    evict_interval=5.0):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.evict_interval = evict_interval
+        # spawn, workers must not inherit state of the server process
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self.generation_slots = asyncio.Semaphore(max_pending_new if max_pending_new is not None else 4 * workers)
+        self.sessions = OrderedDict()# session id -> GameSession, least recently used first
+        self.num_pending_new = 0# sessions being generated, they count toward max_sessions
+        self.num_evicted = 0
+        self.num_requests = 0
+        self.connections = {}# writer -> handler task of open connections
+        self.server = None
+        self.evict_task = None
+
+        self.operations = {'new': self.op_new, 'move': self.op_move, 'hint': self.op_hint,
+            'check': self.op_check, 'solved': self.op_solved, 'close': self.op_close, 'stats': self.op_stats}
+
+    async def start(self, host='127.0.0.1', port=8765, unix_path=None, backlog=1024):
+        # backlog is big enough for a burst of clients connecting at once
+        if unix_path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, unix_path, limit=MAX_LINE,
+                backlog=backlog)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_LINE,
+                backlog=backlog)
+        self.evict_task = asyncio.create_task(self.evict_loop())
+        return self.server
+
+    async def close(self):
+        if self.evict_task is not None:
+            self.evict_task.cancel()
+        if self.server is not None:
+            self.server.close()
+            for writer in self.connections:
+                writer.close()
+            # handlers see the end of their stream and finish
+            await asyncio.gather(*self.connections.values(), return_exceptions=True)
+            await self.server.wait_closed()
+        await asyncio.to_thread(self.executor.shutdown, wait=True, cancel_futures=True)
+
+    def addresses(self):
+        return [sock.getsockname() for sock in self.server.sockets]
+
+    async def evict_loop(self):
+        while True:
+            await asyncio.sleep(self.evict_interval)
+            self.evict_idle()
+
+    def evict_idle(self, now=None):
+        """
+            drop sessions idle longer than idle_timeout, returns how many
+        """
+        deadline = (now if now is not None else time.monotonic()) - self.idle_timeout
+        sessions = self.sessions
+        num_evicted = 0
+        while sessions:
+            session_id, session = next(iter(sessions.items()))
+            if session.last_used > deadline:
+                break
+            del sessions[session_id]
+            num_evicted += 1
+        self.num_evicted += num_evicted
+        return num_evicted
+
+    def get_session(self, request):
+        session_id = request.get('session')
+        session = self.sessions.get(session_id) if type(session_id) is str else None
+        if session is None:
+            raise Exception("unknown session")
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session.model
+
+    async def handle_connection(self, reader, writer):
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # line over MAX_LINE, framing is lost
+                    writer.write(b'{"ok":false,"error":"request line too long"}\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self.handle_line(line)
+                writer.write(json.dumps(response, separators=(',', ':')).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            del self.connections[writer]
+            writer.close()
+
+    async def handle_line(self, line):
+        self.num_requests += 1
+        request_id = None
+        try:
+            request = json.loads(line)
+            if type(request) is not dict:
+                raise Exception("request must be JSON object")
+            request_id = request.get('id')
+            operation = self.operations.get(request.get('op'))
+            if operation is None:
+                raise Exception("unknown op")
+            response = await operation(request)
+            response['ok'] = True
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+        if request_id is not None:
+            response['id'] = request_id
+        return response
+
+    async def op_new(self, request):
+        square_size = _int_field(request, 'square_size', 2, 4, default=3)
+        size = square_size * square_size
+        target_clues = _int_field(request, 'clues', 0, size * size,
+            default=SudokuLogic.get_default_target_clues(square_size))
+        if len(self.sessions) + self.num_pending_new >= self.max_sessions and self.evict_idle() == 0:
+            raise Exception("too many sessions")
+
+        self.num_pending_new += 1
+        try:
+            async with self.generation_slots:
+                loop = asyncio.get_running_loop()
+                solved_board, clear_table = await loop.run_in_executor(self.executor, generate_puzzle,
+                    target_clues, square_size)
+        finally:
+            self.num_pending_new -= 1
+        model = SudokuLogic(apply_clear_table(solved_board, clear_table), solution=solved_board)
+
+        session_id = secrets.token_hex(8)
+        self.sessions[session_id] = GameSession(model)
+        return {'session': session_id, 'square_size': square_size, 'board': board_to_line(model.game_board.to_lists())}
+
+    async def op_move(self, request):
+        model = self.get_session(request)
+        row = _int_field(request, 'row', 0, model.size - 1)
+        col = _int_field(request, 'col', 0, model.size - 1)
+        value = _int_field(request, 'value', 0, model.size)
+        if model.game_board.values[row*model.size + col] != value:
+            num_moves = model.num_moves
+            model.update_cell(row, col, value)
+            if model.num_moves == num_moves:
+                raise Exception("cell is not changeable")
+            model.update_correct_values(False)# keeps list of changed cells short
+        return {'solved': model.is_puzzle_solved()}
+
+    async def op_hint(self, request):
+        model = self.get_session(request)
+        hint = model.add_hint_value()
+        model.update_correct_values(False)
+        if hint is None:
+            return {'row': None, 'col': None, 'value': None, 'technique': None, 'solved': True}
+        row, col = divmod(hint.cell, model.size)
+        return {'row': row, 'col': col, 'value': hint.value, 'technique': hint.technique,
+            'solved': model.is_puzzle_solved()}
+
+    async def op_check(self, request):
+        model = self.get_session(request)
+        wrong = []
+        if model.num_wrong:
+            size = model.size
+            wrong = [list(divmod(i, size)) for i, (value, solved_value)
+                in enumerate(zip(model.game_board.values, model.solved_values)) if value and value != solved_value]
+        return {'wrong': wrong}
+
+    async def op_solved(self, request):
+        model = self.get_session(request)
+        return {'solved': model.is_puzzle_solved(), 'filled': model.num_filled}
+
+    async def op_close(self, request):
+        self.get_session(request)
+        del self.sessions[request['session']]
+        return {}
+
+    async def op_stats(self, request):
+        return {'sessions': len(self.sessions), 'evicted': self.num_evicted, 'requests': self.num_requests,
+            'connections': len(self.connections)}
+
+async def serve(args):
+    server = SudokuServer(workers=args.workers, max_sessions=args.max_sessions,
+        max_pending_new=args.max_pending_new, idle_timeout=args.idle_timeout)
+    await server.start(args.host, args.port, args.unix, args.backlog)
+    # first line tells scripts (e.g. benchmarks/load_test.py) the server is ready
+    print("listening on", args.unix if args.unix is not None else "%s:%d" % server.addresses()[0][:2], flush=True)
+    # SIGTERM/SIGINT stop the server so pool workers are shut down and do not outlive it
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        if args.unix is not None and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON-lines server of headless sudoku sessions")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help="0 picks a free port")
+    parser.add_argument('--unix', default=None, metavar='PATH', help="listen on unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="puzzle generation processes")
+    parser.add_argument('--backlog', type=int, default=1024, help="pending connections queue")
+    parser.add_argument('--max-sessions', type=int, default=10000)
+    parser.add_argument('--max-pending-new', type=int, default=None,
+                            help="puzzles generated at once, default 4 per worker")
+    parser.add_argument('--idle-timeout', type=float, default=600.0, help="seconds before idle session is dropped")
+    args = parser.parse_args(argv)
+
+    asyncio.run(serve(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+import math
+
+# precomputed cell -> unit tables for every square size already used
+_contexts = {}
+
+class SolverContext:
+    """
+        lookup tables shared by all boards with the same square size
+    """
+    def __init__(self, square_size):
+        size = square_size * square_size
+        self.square_size = square_size
+        self.size = size
+        self.num_cells = size * size
+        self.full_mask = (1 << size) - 1
+        self.bit_digit = {1 << d: d + 1 for d in range(size)}
+
+        self.cell_row = [i // size for i in range(self.num_cells)]
+        self.cell_col = [i % size for i in range(self.num_cells)]
+        self.cell_box = [(r // square_size) * square_size + c // square_size
+            for r, c in zip(self.cell_row, self.cell_col)]
+
+        # every unit is (kind, index, cells); kind 0 - row, 1 - col, 2 - box
+        self.units = []
+        for r in range(size):
+            self.units.append((0, r, [r * size + c for c in range(size)]))
+        for c in range(size):
+            self.units.append((1, c, [r * size + c for r in range(size)]))
+        for b in range(size):
+            self.units.append((2, b, [i for i in range(self.num_cells) if self.cell_box[i] == b]))
+
+        # unit ids of every cell and cells sharing a unit with it
+        self.cell_units = [(self.cell_row[i], size + self.cell_col[i], 2*size + self.cell_box[i])
+            for i in range(self.num_cells)]
+        self.peers = []
+        for i in range(self.num_cells):
+            peers = set()
+            for unit_id in self.cell_units[i]:
+                peers.update(self.units[unit_id][2])
+            peers.discard(i)
+            self.peers.append(sorted(peers))
+
+def get_context(square_size):
+    context = _contexts.get(square_size)
+    if context is None:
+        context = SolverContext(square_size)
+        _contexts[square_size] = context
+    return context
+
+def square_size_of(board):
+    square_size = math.isqrt(len(board))
+    if square_size * square_size != len(board) or square_size == 0:
+        raise ValueError("board side must be a square number, got " + str(len(board)))
+    return square_size
+
+def load_board(board, context):
+    """
+        flatten 2D board into values list and row/col/box masks of used digits.
+        returns None if givens are out of range or repeat in some unit
+    """
+    size = context.size
+    values = [0] * context.num_cells
+    rows = [0] * size
+    cols = [0] * size
+    boxes = [0] * size
+    for y in range(size):
+        for x in range(size):
+            val = board[y][x]
+            if val is None or val == 0:
+                continue
+            if val < 1 or val > size:
+                return None
+            i = y * size + x
+            bit = 1 << (val - 1)
+            r, c, b = context.cell_row[i], context.cell_col[i], context.cell_box[i]
+            if (rows[r] | cols[c] | boxes[b]) & bit:
+                return None
+            values[i] = val
+            rows[r] |= bit
+            cols[c] |= bit
+            boxes[b] |= bit
+    return values, rows, cols, boxes
+
+def _propagate(values, rows, cols, boxes, context):
+    """
+        place naked and hidden singles until nothing changes.
+        candidates are updated only for peers of placed cells and hidden singles
+        are searched only in units that changed.
+        returns candidate masks per cell (0 for filled cells) or None on contradiction
+    """
+    cell_row = context.cell_row
+    cell_col = context.cell_col
+    cell_box = context.cell_box
+    cell_units = context.cell_units
+    peers = context.peers
+    units = context.units
+    full_mask = context.full_mask
+    bit_digit = context.bit_digit
+    masks_by_kind = (rows, cols, boxes)
+
+    cands = [0] * context.num_cells
+    singles = []
+    for i in range(context.num_cells):
+        if values[i]:
+            continue
+        cand = full_mask & ~(rows[cell_row[i]] | cols[cell_col[i]] | boxes[cell_box[i]])
+        if cand == 0:
+            return None
+        cands[i] = cand
+        if cand & (cand - 1) == 0:
+            singles.append(i)
+
+    dirty_units = set(range(len(units)))
+    while True:
+        # naked singles
+        while singles:
+            i = singles.pop()
+            if values[i]:
+                continue
+            bit = cands[i]
+            if bit == 0:
+                return None
+            values[i] = bit_digit[bit]
+            rows[cell_row[i]] |= bit
+            cols[cell_col[i]] |= bit
+            boxes[cell_box[i]] |= bit
+            cands[i] = 0
+            for p in peers[i]:
+                cand = cands[p]
+                if cand & bit:
+                    cand ^= bit
+                    if cand == 0:
+                        return None
+                    cands[p] = cand
+                    if cand & (cand - 1) == 0:
+                        singles.append(p)
+            dirty_units.update(cell_units[i])
+
+        if not dirty_units:
+            return cands
+
+        # hidden singles
+        units_to_check = dirty_units
+        dirty_units = set()
+        for unit_id in units_to_check:
+            kind, index, cells = units[unit_id]
+            once = 0
+            twice = 0
+            for i in cells:
+                cand = cands[i]
+                if cand:
+                    twice |= once & cand
+                    once |= cand
+            used = masks_by_kind[kind][index]
+            if (once | used) != full_mask:
+                return None
+            hidden = once & ~twice & ~used
+            if not hidden:
+                continue
+            for i in cells:
+                bit = cands[i] & hidden
+                if bit:
+                    if bit & (bit - 1):
+                        # one cell is the only place for two digits
+                        return None
+                    cands[i] = bit
+                    singles.append(i)
+
+        if not singles:
+            return cands
+
+def _search(values, rows, cols, boxes, context, solutions, limit, budget=None):
+    """
+        depth-first search branching on the cell with the fewest candidates.
+        found solutions are appended to solutions until limit is reached.
+        budget is [nodes left], search gives up when it drops below 0
+    """
+    if budget is not None:
+        budget[0] -= 1
+        if budget[0] < 0:
+            return
+    cands = _propagate(values, rows, cols, boxes, context)
+    if cands is None:
+        return
+
+    best_cell = -1
+    best_count = context.size + 1
+    for i in range(context.num_cells):
+        cand = cands[i]
+        if cand:
+            count = bin(cand).count("1")
+            if count < best_count:
+                best_cell = i
+                best_count = count
+                if count == 2:
+                    break
+
+    if best_cell < 0:
+        solutions.append(values)
+        return
+
+    r, c, b = context.cell_row[best_cell], context.cell_col[best_cell], context.cell_box[best_cell]
+    cand = cands[best_cell]
+    while cand:
+        bit = cand & -cand
+        cand ^= bit
+
+        new_values = values[:]
+        new_rows = rows[:]
+        new_cols = cols[:]
+        new_boxes = boxes[:]
+        new_values[best_cell] = context.bit_digit[bit]
+        new_rows[r] |= bit
+        new_cols[c] |= bit
+        new_boxes[b] |= bit
+
+        _search(new_values, new_rows, new_cols, new_boxes, context, solutions, limit, budget)
+        if len(solutions) >= limit or (budget is not None and budget[0] < 0):
+            return
+
+def _run_search(board, limit):
+    context = get_context(square_size_of(board))
+    loaded = load_board(board, context)
+    if loaded is None:
+        return context, []
+    solutions = []
+    _search(*loaded, context, solutions, limit)
+    return context, solutions
+
+def solve_board(board):
+    """
+        solve 2D board where empty cells are 0 or None.
+        returns solved 2D board or None if there is no solution
+    """
+    context, solutions = _run_search(board, 1)
+    if not solutions:
+        return None
+    values = solutions[0]
+    size = context.size
+    return [values[size*n:size*n+size] for n in range(size)]# 1D -> 2D
+
+def count_solutions(board, limit=2):
+    """
+        count solutions of 2D board, stops as soon as limit solutions are found.
+        count_solutions(board) == 1 means the puzzle is unique
+    """
+    _, solutions = _run_search(board, limit)
+    return len(solutions)
+
+def has_unique_solution(board):
+    return count_solutions(board, limit=2) == 1
+
+def has_other_solution(board, y, x, value, max_nodes=None):
+    """
+        True if board has a solution where cell (y, x), empty in board, is not value.
+        cheaper than count_solutions when one solution is already known.
+        if search takes more than max_nodes nodes, gives up and returns True
+    """
+    context = get_context(square_size_of(board))
+    loaded = load_board(board, context)
+    if loaded is None:
+        return False
+    values, rows, cols, boxes = loaded
+
+    i = y * context.size + x
+    r, c, b = context.cell_row[i], context.cell_col[i], context.cell_box[i]
+    cand = context.full_mask & ~(rows[r] | cols[c] | boxes[b]) & ~(1 << (value - 1))
+    budget = [max_nodes] if max_nodes is not None else None
+    while cand:
+        bit = cand & -cand
+        cand ^= bit
+
+        new_values = values[:]
+        new_rows = rows[:]
+        new_cols = cols[:]
+        new_boxes = boxes[:]
+        new_values[i] = context.bit_digit[bit]
+        new_rows[r] |= bit
+        new_cols[c] |= bit
+        new_boxes[b] |= bit
+
+        solutions = []
+        _search(new_values, new_rows, new_cols, new_boxes, context, solutions, 1, budget)
+        if solutions or (budget is not None and budget[0] < 0):
+            return True
+    return False
@@ -1,60 +1,35 @@
+import math
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, permutations, product
+from operator import itemgetter
+from sudoku_solver import has_other_solution, get_context
 
 def checkRowsCols(board):
     """
-        numbers in rows and cols are unique and not None
-    """
-    for i in range(9):
-        rows_nums = [None] * 9# for elements from 1 to 9
-        cols_nums = [None] * 9# for elements from 1 to 9
-        for j in range(9):
-            val_rows = board[i][j]
-            val_cols = board[j][i]
-
-            # rows
-            if val_rows is not None and val_rows <= 9 and val_rows >= 1:
-                if rows_nums[val_rows-1] is None:
-                    rows_nums[val_rows-1] = True
-                else:
-                    #print("found repeated value")
-                    return False
-            else:
-                #print("value in board is non-valid")
-                return False
-
-            # cols
-            if val_cols is not None and val_cols <= 9 and val_cols >= 1:
-                if cols_nums[val_cols-1] is None:
-                    cols_nums[val_cols-1] = True
-                else:
-                    #print("found repeated value")
-                    return False
-            else:
-                #print("value in board is non-valid")
-                return False
-    return True
+        numbers in rows and cols are unique and not None.
+        board side is size = square_size*square_size, digits are from 1 to size
+    """
+    size = len(board)
+    digits = set(range(1, size+1))
+    if set(map(len, board)) != {size}:
+        return False
+    # set of size values equal to all digits means none is repeated, None or out of range
+    return all(map(digits.__eq__, map(set, board))) and all(map(digits.__eq__, map(set, zip(*board))))
 
 def checkSquares(board):
     """
-        check 3 by 3 squares for unique values and non-None
-    """
-    for row in [v for v in range(0,9,3)]:# row_begin coordinates
-        for col in [v for v in range(0,9,3)]:# col_begin coordinates
-            nums = [None]*9# for elements from 1 to 9
-            for row_step in range(3):
-                y = row + row_step
-                for col_step in range(3):
-                    x = col + col_step
-                    val = board[y][x]
-                    if val is not None and val <= 9 and val >= 1:
-                        if nums[val-1] is None:
-                            nums[val-1] = True
-                        else:
-                            #print("found repeated value")
-                            return False
-                    else:
-                        #print("value in board is non-valid")
-                        return False
+        check square_size by square_size squares for unique values and non-None
+    """
+    size = len(board)
+    square_size = math.isqrt(size)
+    digits = set(range(1, size+1))
+    for row in range(0,size,square_size):# row_begin coordinates
+        band_cols = iter(zip(*board[row:row+square_size]))# columns of the band, square_size values each
+        for square in zip(*[band_cols]*square_size):# next square_size columns make a square
+            if set(chain.from_iterable(square)) != digits:
+                return False
     return True
 
 def generate_sudoku_board(square_size=3):
@@ -63,7 +38,7 @@ def generate_sudoku_board(square_size=3):
 
     def get_random_positions(square_size=3):
         """
-            get random shuffled groups of [0,1,2] [3,4,5] [6,7,8]
+            get random shuffled groups of [0,1,2] [3,4,5] [6,7,8] (for square_size 3)
         """
         #[random_square_pos for random_square_pos in shuffle([i for i in range(square_size)])]
         grid_pos = [i for i in range(square_size)]
@@ -71,7 +46,7 @@ def generate_sudoku_board(square_size=3):
         random.shuffle(pos_in_grid)
         random.shuffle(grid_pos)
 
-        return [random_pos_in_grid*3 + random_square_pos
+        return [random_pos_in_grid*square_size + random_square_pos
                 for random_pos_in_grid in pos_in_grid
                     for random_square_pos in grid_pos]
 
@@ -79,10 +54,10 @@ def generate_sudoku_board(square_size=3):
     board = [[(y*square_size+x+y//square_size)%width+1 for x in range(width)] for y in range(height)]
 
     # get exchanged row positions
-    new_row_positions = get_random_positions()
+    new_row_positions = get_random_positions(square_size)
 
     # get exchanged column positions
-    new_col_positions = get_random_positions()
+    new_col_positions = get_random_positions(square_size)
 
     shuffled_board = [[None]*width for _ in range(height)]
 
@@ -95,6 +70,168 @@ def generate_sudoku_board(square_size=3):
 
     return shuffled_board
 
+# biggest square size filled by backtracking, 25x25 fills stall too often and start from the pattern
+MAX_FILL_SQUARE_SIZE = 4
+
+def _fill_grid(values, rows, cols, boxes, empty, context, budget):
+    # randomized backtracking on the empty cell with fewest candidates, False if out of nodes
+    if not empty:
+        return True
+    cell_row, cell_col, cell_box = context.cell_row, context.cell_col, context.cell_box
+    full_mask = context.full_mask
+    best = 0
+    best_count = context.size + 1
+    best_mask = 0
+    for k, i in enumerate(empty):
+        mask = full_mask & ~(rows[cell_row[i]] | cols[cell_col[i]] | boxes[cell_box[i]])
+        count = mask.bit_count()
+        if count < best_count:
+            best, best_count, best_mask = k, count, mask
+            if count <= 1:
+                break
+    if best_count == 0:
+        return False
+    budget[0] -= 1
+    if budget[0] < 0:
+        return False
+
+    i = empty[best]
+    rest = empty[:best] + empty[best+1:]
+    r, c, b = cell_row[i], cell_col[i], cell_box[i]
+    digits = [d for d in range(context.size) if best_mask >> d & 1]
+    random.shuffle(digits)
+    for d in digits:
+        bit = 1 << d
+        rows[r] |= bit
+        cols[c] |= bit
+        boxes[b] |= bit
+        if _fill_grid(values, rows, cols, boxes, rest, context, budget):
+            values[i] = d + 1
+            return True
+        rows[r] ^= bit
+        cols[c] ^= bit
+        boxes[b] ^= bit
+        if budget[0] < 0:
+            return False
+    return False
+
+def fill_random_grid(square_size=3):
+    """
+        new solved grid as flat bytes, filled by randomized bitmask backtracking
+        after random boxes on the diagonal, which do not share units.
+        boards above MAX_FILL_SQUARE_SIZE come from generate_sudoku_board
+    """
+    if square_size > MAX_FILL_SQUARE_SIZE:
+        return bytes(chain.from_iterable(generate_sudoku_board(square_size)))
+    context = get_context(square_size)
+    size = context.size
+    while True:
+        values = [0] * context.num_cells
+        rows, cols, boxes = [0] * size, [0] * size, [0] * size
+        for box in range(0, size, square_size + 1):
+            for i, value in zip(context.units[2*size + box][2], random.sample(range(1, size+1), size)):
+                bit = 1 << (value-1)
+                values[i] = value
+                rows[context.cell_row[i]] |= bit
+                cols[context.cell_col[i]] |= bit
+                boxes[box] |= bit
+        empty = [i for i in range(context.num_cells) if values[i] == 0]
+        budget = [4 * context.num_cells]# restart on a stalled fill instead of searching it through
+        if _fill_grid(values, rows, cols, boxes, empty, context, budget):
+            return bytes(values)
+
+class GridSymmetry:
+    """
+        random element of the full sudoku symmetry group applied to flat grids: bands and
+        stacks shuffled, rows and cols shuffled inside them, transposition and digit relabeling
+    """
+    # all row orders are listed if there are not more than this (1296 for 9x9)
+    max_listed_orders = 5000
+
+    def __init__(self, square_size):
+        size = square_size * square_size
+        self.square_size = square_size
+        self.size = size
+        self.digits = bytes(range(1, size+1))
+        self.transpose = itemgetter(*[x*size + y for y in range(size) for x in range(size)])
+
+        self.row_getters = None
+        self.col_getters = None
+        if math.factorial(square_size) ** (square_size+1) <= self.max_listed_orders:
+            orders = GridSymmetry.line_orders(square_size)
+            self.row_getters = [itemgetter(*[r*size + x for r in order for x in range(size)]) for order in orders]
+            self.col_getters = [itemgetter(*[y*size + c for y in range(size) for c in order]) for order in orders]
+
+    @staticmethod
+    def line_orders(square_size):
+        # every order of rows which keeps bands together
+        orders = list(permutations(range(square_size)))
+        return [[band*square_size + row for band, band_order in zip(bands, band_orders) for row in band_order]
+            for bands in orders for band_orders in product(orders, repeat=square_size)]
+
+    def random_line_order(self):
+        square_size = self.square_size
+        return [band*square_size + row for band in random.sample(range(square_size), square_size)
+            for row in random.sample(range(square_size), square_size)]
+
+    def random_transform(self, grid):
+        """
+            flat grid bytes -> transformed flat grid bytes
+        """
+        if self.row_getters is not None:
+            grid = random.choice(self.col_getters)(random.choice(self.row_getters)(grid))
+        else:
+            size = self.size
+            cols = self.random_line_order()
+            grid = itemgetter(*[r*size + c for r in self.random_line_order() for c in cols])(grid)
+        if random.getrandbits(1):
+            grid = self.transpose(grid)
+        labels = bytearray(self.digits)
+        random.shuffle(labels)
+        return bytes(grid).translate(bytes.maketrans(self.digits, labels))
+
+_symmetries = {}
+
+def get_symmetry(square_size):
+    symmetry = _symmetries.get(square_size)
+    if symmetry is None:
+        symmetry = GridSymmetry(square_size)
+        _symmetries[square_size] = symmetry
+    return symmetry
+
+def random_solved_board(square_size=3):
+    """
+        new solved board as 2D list, random symmetry of a fill_random_grid
+    """
+    size = square_size * square_size
+    flat = get_symmetry(square_size).random_transform(fill_random_grid(square_size))
+    return [list(flat[i:i+size]) for i in range(0, size * size, size)]# 1D -> 2D
+
+def generate_grids(n=None, square_size=3, transforms_per_fill=64):
+    """
+        yield n (endless if None) solved grids as 2D lists, each checked with checkRowsCols and
+        checkSquares. every transforms_per_fill grids are random symmetries of a new
+        fill_random_grid; they look different but have the same canonical form (sudoku_canon),
+        so only about n / transforms_per_fill grids are essentially different.
+        diverse grids come at the fill_random_grid rate, about 2k/s for 9x9 against
+        about 12k/s of symmetry copies; 1 makes every grid a fresh fill
+    """
+    if transforms_per_fill < 1:
+        raise ValueError("transforms_per_fill must be at least 1")
+    symmetry = get_symmetry(square_size)
+    size = symmetry.size
+    num_cells = size * size
+    count = 0
+    while n is None or count < n:
+        base = fill_random_grid(square_size)
+        for _ in range(transforms_per_fill if n is None else min(transforms_per_fill, n - count)):
+            flat = symmetry.random_transform(base)
+            grid = [list(flat[i:i+size]) for i in range(0, num_cells, size)]# 1D -> 2D
+            if not checkRowsCols(grid) or not checkSquares(grid):
+                raise Exception("grid generation failed")
+            yield grid
+            count += 1
+
 def get_clear_table(percent_clear=40, square_size=3):
     width = square_size*square_size
     height = square_size*square_size
@@ -104,7 +241,128 @@ def get_clear_table(percent_clear=40, square_size=3):
 
     clear_table = [0 for _ in range(num_clear)] + [1 for _ in range(total_digits - num_clear)]
     random.shuffle(clear_table)
-    clear_table = [clear_table[9*n:9*n+9] for n in range(9)]# 1D -> 2D
+    clear_table = [clear_table[width*n:width*n+width] for n in range(height)]# 1D -> 2D
     #print(len(clear_table))
 
     return clear_table
+
+def get_unique_clear_table(board, target_clues=30, max_search_nodes=1000):
+    """
+        blank cells of solved board one at a time in random order,
+        a blank is kept only if the puzzle still has exactly one solution.
+        stops when target_clues cells are left or no more cells can be blanked.
+        a cell whose uniqueness check needs more than max_search_nodes search nodes is kept,
+        this bounds the cost on big boards at the price of a few extra clues
+    """
+    size = len(board)
+    square_size = math.isqrt(size)
+    full_mask = (1 << size) - 1
+
+    puzzle = [row[:] for row in board]
+    clear_table = [[1]*size for _ in range(size)]
+    num_clues = size * size
+
+    # digits present in every row/col/box of puzzle
+    rows = [full_mask] * size
+    cols = [full_mask] * size
+    boxes = [full_mask] * size
+
+    positions = [(y, x) for y in range(size) for x in range(size)]
+    random.shuffle(positions)
+    for y, x in positions:
+        if num_clues <= target_clues:
+            break
+        value = puzzle[y][x]
+        bit = 1 << (value-1)
+        box = (y//square_size)*square_size + x//square_size
+        rows[y] ^= bit
+        cols[x] ^= bit
+        boxes[box] ^= bit
+        puzzle[y][x] = 0
+
+        # if the value is the only candidate left for the cell (naked single),
+        # blanking it keeps the solution unique and no search is needed
+        if (rows[y] | cols[x] | boxes[box]) == full_mask ^ bit or\
+                not has_other_solution(puzzle, y, x, value, max_search_nodes):
+            clear_table[y][x] = 0
+            num_clues -= 1
+        else:
+            puzzle[y][x] = value
+            rows[y] |= bit
+            cols[x] |= bit
+            boxes[box] |= bit
+
+    return clear_table
+
+def generate_puzzle(target_clues=30, square_size=3):
+    """
+        returns (solved_board, clear_table) with unique solution
+    """
+    solved_board = random_solved_board(square_size)
+    return solved_board, get_unique_clear_table(solved_board, target_clues)
+
+def _init_batch_worker():
+    # forked workers share parent random state, reseed to not produce same puzzles
+    random.seed()
+
+def _generate_puzzle_task(args):
+    return generate_puzzle(*args)
+
+def generate_stream(n, workers=None, target_clues=30, square_size=3, task=_generate_puzzle_task):
+    """
+        yield n unique-solution puzzles as (solved_board, clear_table) generated on a process pool.
+        tasks are submitted in chunks, so memory does not grow with n.
+        task(args) with args (target_clues, square_size) makes one result, it must be picklable
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for _ in range(n):
+            yield task((target_clues, square_size))
+        return
+
+    chunk = workers * 16
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as executor:
+        left = n
+        while left > 0:
+            tasks = [(target_clues, square_size)] * min(chunk, left)
+            left -= len(tasks)
+            yield from executor.map(task, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+
+def generate_batch(n, workers=None, target_clues=30, square_size=3):
+    """
+        generate n unique-solution puzzles on a process pool,
+        workers=None uses all cores. returns list of (solved_board, clear_table)
+    """
+    return list(generate_stream(n, workers, target_clues, square_size))
+
+# cell chars in line format: '1'-'9', then 'A' for 10 up to 'P' for 25
+line_digits = '123456789ABCDEFGHIJKLMNOP'
+_line_values = {char: value for value, char in enumerate(line_digits, 1)}
+_line_values.update({char.lower(): value for char, value in list(_line_values.items())})
+_line_values.update({'.': 0, '0': 0})
+
+def board_from_line(line):
+    """
+        line of size*size chars (81, 256 or 625) -> 2D board, '.' and '0' are empty cells.
+        returns None if line has wrong length or characters
+    """
+    line = line.strip()
+    size = math.isqrt(len(line))
+    square_size = math.isqrt(size)
+    if size*size != len(line) or square_size*square_size != size or size == 0:
+        return None
+    values = []
+    for char in line:
+        value = _line_values.get(char)
+        if value is None or value > size:
+            return None
+        values.append(value)
+    return [values[size*n:size*n+size] for n in range(size)]# 1D -> 2D
+
+def board_to_line(board, empty='.'):
+    return ''.join(line_digits[val-1] if val else empty for row in board for val in row)
+
+def apply_clear_table(board, clear_table):
+    return [[el_b*el_c for el_b,el_c in zip(row_board,row_clear)]
+        for row_board,row_clear in zip(board,clear_table)]